@@ -0,0 +1,232 @@
+"""Micro-benchmarks for build_line ops and tools helpers
+
+    python benchmarks/bench.py                  # compare with benchmarks/baseline.json
+    python benchmarks/bench.py --save           # record a new baseline
+    python benchmarks/bench.py -k fillet --threshold 0.5
+
+Time of a benchmark is the best per-call time of several repeats. It
+regresses when it's slower than the baseline by more than the threshold
+(a fraction, 0.25 by default), the runner exits with 1 in this case.
+Baselines are machine specific, record them on the machine you compare
+on.
+"""
+import os
+import sys
+import json
+import timeit
+import argparse
+import platform
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from build123d import *
+from build123d_draft import *
+from build123d_draft.utils import param_on_point, trim_wire
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+benchmarks = {}
+
+
+def bench(name):
+    """Register a benchmark, the function prepares data and returns a callable to time"""
+    def decorator(fn):
+        benchmarks[name] = fn
+        return fn
+    return decorator
+
+
+def zigzag(n, step=10):
+    return [X(step) if i % 2 == 0 else Y(step if i % 4 == 1 else -step) for i in range(n)]
+
+
+@bench('op_line.length')
+def _():
+    ops = [op_line(10, angle=30)] * 20
+    return lambda: build_line().append(*ops)
+
+
+@bench('op_line.until')
+def _():
+    ops = [X(10), op_line(dir=(1, 1), until=Axis.X.offset(Y=30))]
+    return lambda: build_line().append(*ops)
+
+
+@bench('op_line.to')
+def _():
+    ops = [op_line(to=(i, i % 3)) for i in range(1, 21)]
+    return lambda: build_line().append(*ops)
+
+
+for _analytic in (False, True):
+    _suffix = '.analytic' if _analytic else ''
+
+    @bench('op_arc.radius_size' + _suffix)
+    def _(analytic=_analytic):
+        ops = [X(10), op_arc(5, 90)]
+        return lambda: build_line(analytic=analytic).append(*ops)
+
+    @bench('op_arc.tangent_to' + _suffix)
+    def _(analytic=_analytic):
+        ops = [X(10), op_arc(to=(15, 5))]
+        return lambda: build_line(analytic=analytic).append(*ops)
+
+    @bench('op_arc.radius_to' + _suffix)
+    def _(analytic=_analytic):
+        ops = [X(10), op_arc(8, to=(15, 5), tangent=False)]
+        return lambda: build_line(analytic=analytic).append(*ops)
+
+    @bench('op_arc.center' + _suffix)
+    def _(analytic=_analytic):
+        ops = [op_arc(5, 120, center=(0, 0), start_angle=30)]
+        return lambda: build_line(analytic=analytic).append(*ops)
+
+    for _count in (1, 8, 32):
+        @bench(f'op_fillet.count={_count}' + _suffix)
+        def _(analytic=_analytic, count=_count):
+            ops = zigzag(count + 1) + [op_fillet(1, count=count)]
+            return lambda: build_line(analytic=analytic).append(*ops)
+
+        @bench(f'op_chamfer.count={_count}' + _suffix)
+        def _(analytic=_analytic, count=_count):
+            ops = zigzag(count + 1) + [op_chamfer(1, count=count)]
+            return lambda: build_line(analytic=analytic).append(*ops)
+
+
+@bench('op_ellipse_arc')
+def _():
+    ops = [X(10), op_ellipse_arc(20, 8, 90)]
+    return lambda: build_line().append(*ops)
+
+
+@bench('op_trim.axis')
+def _():
+    ops = [X(10), op_arc(to=(20, 20)), op_trim(Axis.X.offset(Y=10), add=True)]
+    return lambda: build_line().append(*ops)
+
+
+@bench('op_trim.by_tangent')
+def _():
+    ops = [op_arc(10, 180, center=(0, 0), start_angle=-90), op_trim(by_tangent((30, 0), idx=0), add=True)]
+    return lambda: build_line().append(*ops)
+
+
+@bench('param_on_point')
+def _():
+    w = build_line().append(*zigzag(50), op_fillet(1, count=49)).wire()
+    p = w @ 0.7
+    return lambda: param_on_point(w, p)
+
+
+@bench('trim_wire')
+def _():
+    w = build_line().append(*zigzag(50), op_fillet(1, count=49)).wire()
+    return lambda: trim_wire(w, 0.2, 0.7)
+
+
+@bench('intersections')
+def _():
+    w = build_line().append(*zigzag(50)).wire()
+    ax = Axis.X.offset(Y=5)
+    return lambda: intersections(w, ax)
+
+
+@bench('make_slot')
+def _():
+    return lambda: make_slot(30, h=5, r=4)
+
+
+@bench('new_edges_add')
+def _():
+    a, b = Box(20, 20, 10), Pos(Z=5) * Cylinder(5, 10)
+    return lambda: new_edges_add(b, a)
+
+
+for _n in (10, 100):
+    @bench(f'wire.{_n}')
+    def _(n=_n):
+        l = build_line().append(*zigzag(n))
+        return lambda: l._wire()
+
+    @bench(f'face.{_n}')
+    def _(n=_n):
+        l = build_line().append(*zigzag(n), op_close())
+        return lambda: l.face()
+
+
+def measure(fn, repeat=5, min_time=0.02):
+    timer = timeit.Timer(fn)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    return min(timer.repeat(repeat, number)) / number
+
+
+def run(pattern=None, repeat=5):
+    rv = {}
+    for name, setup in benchmarks.items():
+        if pattern and pattern not in name:
+            continue
+        try:
+            rv[name] = measure(setup(), repeat)
+        except Exception as e:
+            rv[name] = None
+            print(f'{name}: {type(e).__name__}: {str(e).splitlines()[0]}', file=sys.stderr)
+    return rv
+
+
+def compare(results, baseline, threshold):
+    """Print a table and return names of regressed benchmarks"""
+    regressed = []
+    print(f'{"benchmark":<32} {"time, us":>12} {"baseline":>12} {"ratio":>7}')
+    for name, t in results.items():
+        base = baseline.get(name)
+        if t is None:
+            cols = f'{"error":>12} {"-" if base is None else f"{base*1e6:.1f}":>12}'
+            if base is not None:
+                regressed.append(name)
+            print(f'{name:<32} {cols}')
+            continue
+        line = f'{name:<32} {t*1e6:>12.1f}'
+        if base:
+            ratio = t / base
+            line += f' {base*1e6:>12.1f} {ratio:>7.2f}'
+            if ratio > 1 + threshold:
+                regressed.append(name)
+                line += '  REGRESSED'
+        print(line)
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-k', dest='pattern', help='run benchmarks with names containing a pattern')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save', action='store_true', help='store results as the baseline')
+    parser.add_argument('--threshold', type=float, default=0.25)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    results = run(args.pattern, args.repeat)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+    regressed = compare(results, baseline, args.threshold)
+    if args.save:
+        baseline.update({k: v for k, v in results.items() if v is not None})
+        with open(args.baseline, 'w') as f:
+            json.dump({'machine': platform.platform(), 'python': platform.python_version(),
+                       'results': baseline}, f, indent=2, sort_keys=True)
+        return 0
+
+    if regressed:
+        print(f'{len(regressed)} regressed over {args.threshold:.0%}: {", ".join(regressed)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
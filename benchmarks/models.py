@@ -0,0 +1,156 @@
+"""Build every @slist model of tests/models on a process pool
+
+    python benchmarks/models.py -j 4 --json models.json
+    python benchmarks/models.py --compare models.json -k ttt
+
+Each model is built in a fresh process on Python 3.11+, so peak RSS is
+per model; older versions reuse workers and only the RSS growth of the
+build is per model. The report has build time, peak RSS and its growth,
+volume and shape counts. With
+--compare a model regresses when it builds slower than in the previous
+report by more than --threshold, changes its volume or starts failing,
+the runner exits with 1 then.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import platform
+import resource
+import importlib
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+COLUMNS = ['time', 'rss', 'volume', 'solids', 'faces', 'edges']
+
+
+def discover(pattern=None):
+    """(module, function) names of @slist models"""
+    rv = []
+    for path in sorted(glob.glob(os.path.join(ROOT, 'tests', 'models', 'test_*.py'))):
+        module = 'tests.models.' + os.path.basename(path)[:-3]
+        for name, fn in vars(importlib.import_module(module)).items():
+            if name.startswith('test_') and hasattr(fn, 'model'):
+                if pattern is None or pattern in f'{module}::{name}':
+                    rv.append((module, name))
+    return rv
+
+
+def _rss():
+    # KiB on Linux, bytes on macOS
+    rv = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rv if sys.platform == 'darwin' else rv * 1024
+
+
+def build(module, name):
+    rv = {'model': f'{module}::{name}', 'error': None}
+    fn = getattr(importlib.import_module(module), name).model
+    rv['rss_base'] = _rss()
+    start = time.perf_counter()
+    try:
+        part = fn()
+    except Exception as e:
+        rv['error'] = ''.join(traceback.format_exception_only(type(e), e)).strip()
+        part = None
+    rv['time'] = time.perf_counter() - start
+    rv['rss'] = _rss()
+    if part is not None:
+        rv['volume'] = part.volume
+        rv.update({k: len(getattr(part, k)()) for k in ('solids', 'faces', 'edges')})
+    return rv
+
+
+def run(models, jobs=None):
+    # a process per model: peak RSS is not inherited and leaks don't pile up
+    kwargs = {'max_tasks_per_child': 1} if sys.version_info >= (3, 11) else {}
+    with ProcessPoolExecutor(jobs, **kwargs) as executor:
+        futures = [executor.submit(build, *it) for it in models]
+        return [it.result() for it in futures]
+
+
+def compare(results, previous, threshold):
+    """Annotate results with previous values, return regressed model names"""
+    prev = {it['model']: it for it in previous}
+    regressed = []
+    for it in results:
+        p = prev.get(it['model'])
+        if p is None:
+            continue
+        it['prev_time'] = p.get('time')
+        reasons = []
+        if it['error'] and not p.get('error'):
+            reasons.append('error')
+        if p.get('time') and it['time'] > p['time'] * (1 + threshold):
+            reasons.append('time')
+        if p.get('volume') is not None and it.get('volume') is not None and \
+                abs(it['volume'] - p['volume']) > 1e-6 * max(1, abs(p['volume'])):
+            reasons.append('volume')
+        it['regressed'] = reasons
+        if reasons:
+            regressed.append(it['model'])
+    return regressed
+
+
+def format_report(results):
+    lines = [f'{"model":<72} {"time, s":>8} {"prev":>8} {"RSS, MiB":>9} {"+RSS":>7} {"volume":>14} '
+             f'{"solids":>6} {"faces":>6} {"edges":>6}']
+    for it in results:
+        prev = it.get('prev_time')
+        volume = it.get('volume')
+        line = (f'{it["model"]:<72} {it["time"]:>8.3f} {"-" if prev is None else f"{prev:.3f}":>8} '
+                f'{it["rss"] / 2**20:>9.1f} {(it["rss"] - it.get("rss_base", it["rss"])) / 2**20:>7.1f} '
+                f'{"-" if volume is None else f"{volume:.3f}":>14} '
+                + ' '.join(f'{it.get(k, "-"):>6}' for k in ('solids', 'faces', 'edges')))
+        if it.get('regressed'):
+            line += '  REGRESSED: ' + ', '.join(it['regressed'])
+        if it['error']:
+            line += '  ! ' + it['error'].splitlines()[0]
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-k', dest='pattern', help='build models with names containing a pattern')
+    parser.add_argument('-j', dest='jobs', type=int, help='number of worker processes')
+    parser.add_argument('--sort', choices=['model'] + COLUMNS, default='model')
+    parser.add_argument('--json', help='write the report as JSON')
+    parser.add_argument('--text', help='write the report as text')
+    parser.add_argument('--compare', help='previous JSON report')
+    parser.add_argument('--threshold', type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    results = run(discover(args.pattern), args.jobs)
+    if args.sort != 'model':
+        results.sort(key=lambda it: it.get(args.sort) or 0, reverse=True)
+
+    regressed = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressed = compare(results, json.load(f)['models'], args.threshold)
+
+    text = format_report(results)
+    print(text)
+    if args.text:
+        with open(args.text, 'w') as f:
+            f.write(text + '\n')
+    if args.json:
+        import OCP
+        import build123d
+        with open(args.json, 'w') as f:
+            json.dump({'build123d': build123d.__version__, 'OCP': getattr(OCP, '__version__', None),
+                       'python': platform.python_version(), 'models': results}, f, indent=2)
+
+    if regressed:
+        print(f'{len(regressed)} models regressed: {", ".join(regressed)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
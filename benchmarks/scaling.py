@@ -0,0 +1,169 @@
+"""Scaling harness for build_line on synthetic profiles
+
+    python benchmarks/scaling.py                # sizes 10..10k
+    python benchmarks/scaling.py --max 100000 -k build
+
+Every case is timed for growing segment counts, the growth exponent
+is a least squares fit of log(time) over log(count) for counts from
+--fit-from. A case fails when its exponent exceeds the expected one by
+more than --tolerance, the runner exits with 1 then. Memory cases
+measure the peak of python allocations with tracemalloc, OCC memory
+is not counted.
+"""
+import os
+import sys
+import math
+import argparse
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from build123d import *
+from build123d_draft import *
+
+from bench import measure
+
+
+def polyline(n):
+    return [(i, 2 + math.sin(i)) for i in range(1, n)] + [(n, 0)]
+
+
+def zigzag(n):
+    return [(5 * i, 10 + 5 * (i % 2)) for i in range(n - 1)] + [(5 * (n - 1), 0)]
+
+
+def arcs(n):
+    return [op_arc(2, 90 if i % 2 else -90) for i in range(n)]
+
+
+def closed(n):
+    return zigzag(n) + [op_close()]
+
+
+def fillet_each(n):
+    ops = zigzag(n)
+    return ops[:1] + [it for op in ops[1:] for it in (op, op_fillet(0.1))]
+
+
+def fillet_closed(n):
+    return closed(n) + [op_fillet(0.1, count=n + 1, closed=True)]
+
+
+class Case:
+    def __init__(self, name, setup, expected, max_size=None, memory=False, known=None):
+        self.name = name
+        self.setup = setup
+        self.expected = expected
+        self.max_size = max_size
+        self.memory = memory
+        # reason a case is expected to grow faster, it is reported but doesn't fail
+        self.known = known
+
+
+def _build(profile, analytic=False):
+    def setup(n):
+        ops = profile(n)
+        return lambda: build_line(analytic=analytic).append(*ops)
+    return setup
+
+
+def _built(profile, fn, analytic=False):
+    def setup(n):
+        l = build_line(analytic=analytic).append(*profile(n))
+        return lambda: fn(l)
+    return setup
+
+
+cases = [
+    Case('build.polyline', _build(polyline), 1),
+    Case('build.polyline.analytic', _build(polyline, True), 1),
+    Case('build.arcs.analytic', _build(arcs, True), 1),
+    Case('build.close', _build(closed), 1),
+    Case('build.fillet_each', _build(fillet_each), 1),
+    Case('build.fillet_closed', _build(fillet_closed), 1),
+    Case('move.polyline', _built(polyline, lambda l: l.move(Pos(1, 0))), 1),
+    Case('move.arcs.analytic', _built(arcs, lambda l: l.move(Pos(1, 0)), True), 1),
+    Case('chains.polyline', _built(polyline, lambda l: l.chains()), 1),
+    Case('wire.polyline', _built(polyline, lambda l: l.wire()), 1),
+    Case('face.zigzag', _built(closed, lambda l: l.face()), 1, max_size=3000,
+         known="build123d make_face runs ShapeFix_Face and ConnectEdgesToWires on the ordered wire"),
+    Case('memory.polyline', _build(polyline), 1, memory=True),
+    Case('memory.arcs.analytic', _build(arcs, True), 1, memory=True),
+]
+
+
+def sizes(max_size):
+    rv = []
+    k = 1
+    while 10**k <= max_size:
+        rv.append(10**k)
+        if 3 * 10**k <= max_size:
+            rv.append(3 * 10**k)
+        k += 1
+    return rv
+
+
+def peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def exponent(counts, values, fit_from):
+    points = [(n, v) for n, v in zip(counts, values) if n >= fit_from and v > 0]
+    if len(points) < 2:
+        return None
+    x, y = np.log(np.array(points)).T
+    return float(np.polyfit(x, y, 1)[0])
+
+
+def run(case, max_size, repeat, fit_from):
+    counts = sizes(min(max_size, case.max_size or max_size))
+    values = []
+    for n in counts:
+        fn = case.setup(n)
+        values.append(peak_memory(fn) if case.memory else measure(fn, repeat))
+    return counts, values, exponent(counts, values, fit_from)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-k', dest='pattern', help='run cases with names containing a pattern')
+    parser.add_argument('--max', type=int, default=10000, help='largest segment count')
+    parser.add_argument('--fit-from', type=int, default=100)
+    parser.add_argument('--tolerance', type=float, default=0.3)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    failed = []
+    for case in cases:
+        if args.pattern and args.pattern not in case.name:
+            continue
+        counts, values, k = run(case, args.max, args.repeat, args.fit_from)
+        unit, scale = ('KiB', 1 / 1024) if case.memory else ('ms', 1000)
+        print(f'{case.name}, {unit}: ' + ' '.join(f'{n}={v*scale:.3g}' for n, v in zip(counts, values)))
+        if k is None:
+            print('  not enough sizes to fit')
+            continue
+        status = 'ok'
+        if k > case.expected + args.tolerance:
+            if case.known:
+                status = f'known failure, {case.known}'
+            else:
+                status = 'FAILED'
+                failed.append(case.name)
+        print(f'  exponent {k:.2f}, expected {case.expected}: {status}')
+
+    if failed:
+        print(f'{len(failed)} cases grow faster than expected: {", ".join(failed)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
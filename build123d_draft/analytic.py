@@ -0,0 +1,404 @@
+import math
+
+import numpy as np
+from OCP.gp import gp_Pnt, gp_Dir, gp_Ax2, gp_Circ
+from OCP.GC import GC_MakeArcOfCircle
+from OCP.BRepBuilderAPI import BRepBuilderAPI_MakeEdge, BRepBuilderAPI_MakeWire
+
+from build123d.geometry import Vector, Location
+from build123d.topology import Edge, Wire
+
+EPS = 1e-9
+TAU = 2 * math.pi
+
+
+def as_array(v):
+    if isinstance(v, Vector):
+        return np.array((v.X, v.Y, v.Z))
+    return np.asarray(v, dtype=float)
+
+
+def to_vector(a):
+    return Vector(float(a[0]), float(a[1]), float(a[2]))
+
+
+def location_matrix(loc: Location):
+    t = loc.wrapped.Transformation()
+    return np.array([[t.Value(i, j) for j in range(1, 5)] for i in range(1, 4)])
+
+
+def _unit(v):
+    return v / np.linalg.norm(v, axis=-1, keepdims=True)
+
+
+class Curve:
+    """Analytic line/arc record, OCC edge is created on demand"""
+    __slots__ = ('_edge', '_lb_name')
+
+    def __init__(self):
+        self._edge = None
+
+    def __getstate__(self):
+        # OCC edge is not pickled, it's rebuilt on demand
+        slots = (k for cls in type(self).__mro__ for k in getattr(cls, '__slots__', ()))
+        return {k: getattr(self, k) for k in slots if k != '_edge' and hasattr(self, k)}
+
+    def __setstate__(self, state):
+        self._edge = None
+        for k, v in state.items():
+            setattr(self, k, v)
+
+    def edge(self) -> Edge:
+        if self._edge is None:
+            self._edge = Edge(self._make_edge())
+        return self._edge
+
+    def ends(self):
+        s, e = self.points()
+        ts, te = self.tangents()
+        return to_vector(s), to_vector(e), to_vector(ts), to_vector(te)
+
+    def moved(self, loc):
+        rv = self.copy()
+        rv.move(loc)
+        return rv
+
+    def move(self, loc):
+        self._transform(location_matrix(loc))
+        self._edge = None
+        return self
+
+    def reverse(self):
+        self._reverse()
+        self._edge = None
+        return self
+
+    def __matmul__(self, param):
+        return to_vector(self.at(param))
+
+    def __mod__(self, param):
+        return to_vector(self.tangent_at(param))
+
+
+class Segment(Curve):
+    __slots__ = ('p',)
+
+    def __init__(self, start, end):
+        super().__init__()
+        self.p = np.array((as_array(start), as_array(end)))
+        if self.length < EPS:
+            raise ValueError('Line requires two distinct points')
+
+    def copy(self):
+        rv = Segment.__new__(Segment)
+        rv._edge = None
+        rv.p = self.p.copy()
+        return rv
+
+    @property
+    def length(self):
+        return float(np.linalg.norm(self.p[1] - self.p[0]))
+
+    def points(self):
+        return self.p[0], self.p[1]
+
+    def tangents(self):
+        t = _unit(self.p[1] - self.p[0])
+        return t, t
+
+    def at(self, param):
+        return self.p[0] + (self.p[1] - self.p[0]) * param
+
+    def tangent_at(self, param=0):
+        return self.tangents()[0]
+
+    def _transform(self, m):
+        self.p = self.p @ m[:, :3].T + m[:, 3]
+
+    def _reverse(self):
+        self.p = self.p[::-1].copy()
+
+    def param(self, point):
+        d = self.p[1] - self.p[0]
+        return float((point - self.p[0]) @ d / (d @ d))
+
+    def trimmed(self, u0, u1):
+        return Segment(self.at(u0), self.at(u1))
+
+    def _make_edge(self):
+        return BRepBuilderAPI_MakeEdge(gp_Pnt(*self.p[0]), gp_Pnt(*self.p[1])).Edge()
+
+
+class Arc(Curve):
+    # rows: center, unit normal, start point; sweep is signed around normal
+    __slots__ = ('d', 'sweep')
+
+    def __init__(self, center, normal, start, sweep):
+        super().__init__()
+        c = as_array(center)
+        n = _unit(as_array(normal))
+        u = as_array(start) - c
+        u -= n * (u @ n)
+        self.d = np.array((c, n, c + u))
+        self.sweep = float(sweep)
+
+    def copy(self):
+        rv = Arc.__new__(Arc)
+        rv._edge = None
+        rv.d = self.d.copy()
+        rv.sweep = self.sweep
+        return rv
+
+    @property
+    def center(self):
+        return self.d[0]
+
+    @property
+    def radius(self):
+        return float(np.linalg.norm(self.d[2] - self.d[0]))
+
+    @property
+    def length(self):
+        return abs(self.sweep) * self.radius
+
+    def _frame(self):
+        c, n, s = self.d
+        u = s - c
+        return c, n, u, np.cross(n, u)
+
+    def at(self, param):
+        c, _, u, v = self._frame()
+        a = self.sweep * param
+        return c + u * math.cos(a) + v * math.sin(a)
+
+    def tangent_at(self, param=0):
+        _, _, u, v = self._frame()
+        a = self.sweep * param
+        return _unit(v * math.cos(a) - u * math.sin(a)) * math.copysign(1, self.sweep)
+
+    def points(self):
+        return self.d[2], self.at(1)
+
+    def tangents(self):
+        return self.tangent_at(0), self.tangent_at(1)
+
+    def _transform(self, m):
+        r = m[:, :3]
+        c, n, s = self.d
+        self.d = np.array((r @ c + m[:, 3], _unit(r @ n), r @ s + m[:, 3]))
+
+    def _reverse(self):
+        c, n, _ = self.d
+        self.d = np.array((c, -n, self.at(1)))
+
+    def param(self, point):
+        c, n, u, v = self._frame()
+        w = point - c
+        a = math.atan2(w @ v, w @ u) * math.copysign(1, self.sweep) % TAU
+        if a > abs(self.sweep) and a > math.pi + abs(self.sweep) / 2:
+            # just before the start
+            a -= TAU
+        return a / abs(self.sweep)
+
+    def trimmed(self, u0, u1):
+        c, n, _ = self.d
+        return Arc(c, n, self.at(u0), self.sweep * (u1 - u0))
+
+    def _make_edge(self):
+        c, n, u, _ = self._frame()
+        sweep = self.sweep
+        if sweep < 0:
+            n, sweep = -n, -sweep
+        circ = gp_Circ(gp_Ax2(gp_Pnt(*c), gp_Dir(*n), gp_Dir(*u)), self.radius)
+        if sweep >= TAU - EPS:
+            return BRepBuilderAPI_MakeEdge(circ).Edge()
+        return BRepBuilderAPI_MakeEdge(GC_MakeArcOfCircle(circ, 0, sweep, True).Value()).Edge()
+
+
+def tangent_arc(start, tangent, end):
+    p0, p1 = as_array(start), as_array(end)
+    t = _unit(as_array(tangent))
+    d = p1 - p0
+    dt = d @ t
+    dn = d - t * dt
+    h = np.linalg.norm(dn)
+    if h < EPS * max(1, np.linalg.norm(d)):
+        raise ValueError('Tangent arc end point lies on the tangent line')
+    m = dn / h
+    return Arc(p0 + m * ((d @ d) / (2 * h)), np.cross(t, m), p0, 2 * math.atan2(h, dt))
+
+
+def three_point_arc(start, mid, end):
+    p0, pm, p1 = as_array(start), as_array(mid), as_array(end)
+    a, b = p0 - p1, pm - p1
+    w = np.cross(a, b)
+    ww = w @ w
+    if ww < EPS:
+        raise ValueError('Arc points are collinear')
+    c = p1 + np.cross((a @ a) * b - (b @ b) * a, w) / (2 * ww)
+    n = _unit(np.cross(pm - p0, p1 - pm))
+    u0, u1 = p0 - c, p1 - c
+    sweep = math.atan2(n @ np.cross(u0, u1), u0 @ u1) % TAU
+    return Arc(c, n, p0, sweep)
+
+
+class Path(Curve):
+    """Chain of joined curves, OCC wire is created on demand"""
+    __slots__ = ('items',)
+
+    def __init__(self, items):
+        super().__init__()
+        self.items = list(items)
+
+    def copy(self):
+        rv = Path.__new__(Path)
+        rv._edge = None
+        rv.items = [it.copy() for it in self.items]
+        return rv
+
+    def edge(self) -> Wire:
+        if self._edge is None:
+            builder = BRepBuilderAPI_MakeWire()
+            for it in self.items:
+                builder.Add(it.edge().wrapped)
+            self._edge = Wire(builder.Wire())
+        return self._edge
+
+    @property
+    def length(self):
+        return sum(it.length for it in self.items)
+
+    def _locate(self, param):
+        rest = self.length * param
+        for it in self.items[:-1]:
+            if rest <= it.length:
+                break
+            rest -= it.length
+        else:
+            it = self.items[-1]
+        return it, rest / it.length
+
+    def at(self, param):
+        it, u = self._locate(param)
+        return it.at(u)
+
+    def tangent_at(self, param=0):
+        it, u = self._locate(param)
+        return it.tangent_at(u)
+
+    def points(self):
+        return self.items[0].points()[0], self.items[-1].points()[1]
+
+    def tangents(self):
+        return self.items[0].tangents()[0], self.items[-1].tangents()[1]
+
+    def _transform(self, m):
+        for it in self.items:
+            it._transform(m)
+            it._edge = None
+
+    def _reverse(self):
+        for it in self.items:
+            it._reverse()
+            it._edge = None
+        self.items.reverse()
+
+
+def _side(a, b, normal):
+    ta, tb = a.tangents()[1], b.tangents()[0]
+    cross = np.cross(ta, tb) @ normal
+    if abs(cross) < EPS:
+        return None
+    return math.copysign(1, cross)
+
+
+def _offset(curve, side, normal, dist):
+    # offset line (point, dir) or circle (center, radius) toward the side
+    if isinstance(curve, Segment):
+        d = curve.tangents()[0]
+        return curve.p[0] + np.cross(normal, d) * side * dist, d
+    c, n, _ = curve.d
+    ccw = math.copysign(1, (n @ normal) * curve.sweep)
+    return c, curve.radius - side * ccw * dist
+
+
+def _intersect(a, b, normal):
+    (p, d), (q, e) = a, b
+    if isinstance(d, np.ndarray) and isinstance(e, np.ndarray):
+        den = np.cross(d, e) @ normal
+        if abs(den) < EPS:
+            return []
+        return [p + d * ((np.cross(q - p, e) @ normal) / den)]
+    if isinstance(e, np.ndarray):
+        (p, d), (q, e) = b, a
+    if isinstance(d, np.ndarray):
+        w = p - q
+        b2, cc = w @ d, w @ w - e * e
+        disc = b2 * b2 - cc
+        if disc < 0:
+            return []
+        return [p + d * (-b2 + k * math.sqrt(disc)) for k in (-1, 1)]
+    w = q - p
+    dist = np.linalg.norm(w)
+    if dist < EPS:
+        return []
+    w /= dist
+    x = (d * d - e * e + dist * dist) / (2 * dist)
+    h2 = d * d - x * x
+    if h2 < 0:
+        return []
+    h = math.sqrt(h2)
+    return [p + w * x + np.cross(normal, w) * k * h for k in (-1, 1)]
+
+
+def _foot(curve, point):
+    if isinstance(curve, Segment):
+        return curve.at(curve.param(point))
+    c = curve.center
+    return c + _unit(point - c) * curve.radius
+
+
+def _planar(curve, normal):
+    if isinstance(curve, Segment):
+        return abs(curve.tangents()[0] @ normal) < EPS
+    return abs(abs(curve.d[1] @ normal) - 1) < EPS
+
+
+def fillet(a, b, radius, normal):
+    """Fillet arc for a corner between end of ``a`` and start of ``b``
+
+    Returns (param on a, param on b, arc) or None if curves are not
+    lines/arcs in the plane or the corner is tangent.
+    """
+    normal = as_array(normal)
+    if radius <= 0:
+        return None
+    if not all(isinstance(it, (Segment, Arc)) and _planar(it, normal) for it in (a, b)):
+        return None
+    side = _side(a, b, normal)
+    if side is None:
+        return None
+    oa, ob = _offset(a, side, normal, radius), _offset(b, side, normal, radius)
+    if any(not isinstance(it[1], np.ndarray) and it[1] < EPS for it in (oa, ob)):
+        return None
+    corner = b.points()[0]
+    centers = _intersect(oa, ob, normal)
+    if not centers:
+        return None
+    f = min(centers, key=lambda it: np.linalg.norm(it - corner))
+    pa, pb = _foot(a, f), _foot(b, f)
+    ua, ub = pa - f, pb - f
+    sweep = math.atan2(side * (np.cross(ua, ub) @ normal), ua @ ub) % TAU
+    return a.param(pa), b.param(pb), Arc(f, normal * side, pa, sweep)
+
+
+def chamfer(a, b, length, normal):
+    """Symmetric chamfer segment for a corner between two lines"""
+    if not (isinstance(a, Segment) and isinstance(b, Segment)):
+        return None
+    if _side(a, b, as_array(normal)) is None:
+        return None
+    corner = b.p[0]
+    pa = corner - a.tangents()[1] * length
+    pb = corner + b.tangents()[0] * length
+    return a.param(pa), b.param(pb), Segment(pa, pb)
@@ -0,0 +1,596 @@
+import math
+import time
+import inspect
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from build123d.geometry import Plane, Axis, Pos, Vector
+
+from .utils import PPos, _defined, _defined_all
+from . import analytic as _an
+from .build_line import build_line, op_data_holder, trusted_ops, _trusted, _ShapeEnds
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _dot(a, b):
+    return np.einsum('...i,...i->...', a, b)
+
+
+def _norm(a):
+    return np.linalg.norm(a, axis=-1)
+
+
+def _unit(a):
+    return a / _norm(a)[..., None]
+
+
+def _rot(v, angle):
+    a = np.radians(angle)
+    c, s = np.cos(a), np.sin(a)
+    x, y = v[..., 0], v[..., 1]
+    return np.stack([x * c - y * s, x * s + y * c, v[..., 2]], -1)
+
+
+class _Lines:
+    __slots__ = ('p',)
+
+    def __init__(self, start, end):
+        self.p = np.stack([start, end], -2)
+        if (_norm(self.p[:, 1] - self.p[:, 0]) < _an.EPS).any():
+            raise ValueError('Line requires two distinct points')
+
+    def ends(self):
+        t = _unit(self.p[:, 1] - self.p[:, 0])
+        return self.p[:, 0], self.p[:, 1], t, t
+
+    def length(self):
+        return _norm(self.p[:, 1] - self.p[:, 0])
+
+    def trimmed(self, start=None, end=None):
+        return _Lines(self.p[:, 0] if start is None else start,
+                      self.p[:, 1] if end is None else end)
+
+    def transform(self, m):
+        rv = _Lines.__new__(_Lines)
+        rv.p = self.p @ m[:, :3].T + m[:, 3]
+        return rv
+
+    def variant(self, idx):
+        return _an.Segment(self.p[idx, 0], self.p[idx, 1])
+
+
+class _Arcs:
+    __slots__ = ('c', 'n', 's', 'sweep')
+
+    def __init__(self, center, normal, start, sweep):
+        self.c = center
+        self.n = _unit(normal)
+        self.s = start
+        self.sweep = sweep
+
+    def _at(self, param):
+        u = self.s - self.c
+        v = np.cross(self.n, u)
+        a = (self.sweep * param)[..., None]
+        p = self.c + u * np.cos(a) + v * np.sin(a)
+        t = _unit(v * np.cos(a) - u * np.sin(a)) * np.sign(self.sweep)[..., None]
+        return p, t
+
+    def ends(self):
+        s, ts = self._at(0)
+        e, te = self._at(1)
+        return s, e, ts, te
+
+    def transform(self, m):
+        r = m[:, :3]
+        return _Arcs(self.c @ r.T + m[:, 3], self.n @ r.T, self.s @ r.T + m[:, 3], self.sweep)
+
+    def variant(self, idx):
+        return _an.Arc(self.c[idx], self.n[idx], self.s[idx], self.sweep[idx])
+
+
+def _tangent_arc(p0, t, p1):
+    t = _unit(t)
+    d = p1 - p0
+    dt = _dot(d, t)
+    dn = d - t * dt[..., None]
+    h = _norm(dn)
+    if (h < _an.EPS * np.maximum(1, _norm(d))).any():
+        raise ValueError('Tangent arc end point lies on the tangent line')
+    m = dn / h[..., None]
+    c = p0 + m * (_dot(d, d) / (2 * h))[..., None]
+    return _Arcs(c, np.cross(t, m), p0, 2 * np.arctan2(h, dt))
+
+
+def _three_point_arc(p0, pm, p1):
+    a, b = p0 - p1, pm - p1
+    w = np.cross(a, b)
+    ww = _dot(w, w)
+    if (ww < _an.EPS).any():
+        raise ValueError('Arc points are collinear')
+    c = p1 + np.cross(_dot(a, a)[..., None] * b - _dot(b, b)[..., None] * a, w) / (2 * ww)[..., None]
+    n = _unit(np.cross(pm - p0, p1 - pm))
+    u0, u1 = p0 - c, p1 - c
+    sweep = np.mod(np.arctan2(_dot(n, np.cross(u0, u1)), _dot(u0, u1)), _an.TAU)
+    return _Arcs(c, n, p0, sweep)
+
+
+def _bind(op):
+    sig = inspect.signature(op.fn)
+    bound = sig.bind(None, *op.args, **op.kwargs)
+    return sig, bound
+
+
+def _substitute(op, values):
+    """Return op with slot values replaced by scalars"""
+    if not values:
+        return op
+    if isinstance(op, PPos):
+        initial = list(op._initial)
+        for k, v in values.items():
+            initial['XYZ'.index(k)] = v
+        rv = PPos(*initial)
+    elif isinstance(op, Pos):
+        p = list(op.position.to_tuple())
+        for k, v in values.items():
+            p['XYZ'.index(k)] = v
+        rv = Pos(*p)
+    elif isinstance(op, tuple):
+        p = list(op)
+        for k, v in values.items():
+            p[k] = v
+        return tuple(p)
+    else:
+        sig, bound = _bind(op)
+        params = list(sig.parameters)
+        for k, v in values.items():
+            bound.arguments[params[k + 1] if isinstance(k, int) else k] = v
+        args = bound.args[1:]
+        return op_data_holder(op.fn, op.name, op.reverse, op.connect, args, bound.kwargs)
+
+    if hasattr(op, 'default_zdir'):
+        rv.default_zdir = op.default_zdir
+    return rv
+
+
+class _Evaluator:
+    def __init__(self, plane, size):
+        self.plane = plane
+        self.size = size
+        # columns are plane axes, local -> global is origin + basis @ local
+        self.basis = np.array([plane.x_dir.to_tuple(), plane.y_dir.to_tuple(),
+                               plane.z_dir.to_tuple()]).T
+        self.origin = np.array(plane.origin.to_tuple())
+        self.records = []
+        self.e = np.zeros((size, 3))
+        self.t = np.tile((1.0, 0, 0), (size, 1))
+
+    def arr(self, v):
+        return np.broadcast_to(np.asarray(v, dtype=float), (self.size,))
+
+    def vec(self, v):
+        return np.broadcast_to(np.asarray(v, dtype=float), (self.size, 3))
+
+    def localize(self, v):
+        return (np.array(v.to_tuple()) - self.origin) @ self.basis
+
+    # mirrors build_line.to_vector in plane local coordinates
+    def to_vector(self, v, ref=None, values=None):
+        values = values or {}
+        if isinstance(v, Pos):
+            if ref is None:
+                ref = self.e
+            if isinstance(v, PPos):
+                p = [values.get(k, it) for k, it in zip('XYZ', v._initial)]
+                return np.stack([ref[:, i] if it is None else self.arr(it)
+                                 for i, it in enumerate(p)], -1)
+            p = v.position.to_tuple()
+            return ref + np.stack([self.arr(values.get(k, it)) for k, it in zip('XYZ', p)], -1)
+        elif isinstance(v, Axis):
+            return self.vec(v.position.to_tuple())
+        elif isinstance(v, tuple):
+            p = [values.get(i, it) for i, it in enumerate(v)]
+            p += [0] * (3 - len(p))
+            return np.stack([self.arr(it) for it in p], -1)
+        elif isinstance(v, Vector):
+            return self.vec(self.localize(v))
+        raise _Unsupported(type(v))
+
+    def to_direction(self, v):
+        if isinstance(v, Pos):
+            v = v.position.to_tuple()
+        if isinstance(v, Vector):
+            return self.vec(np.array(v.to_tuple()) @ self.basis)
+        elif isinstance(v, Axis):
+            return self.vec(v.direction.to_tuple())
+        elif isinstance(v, tuple):
+            return self.to_vector(v)
+        raise _Unsupported(type(v))
+
+    def normal_plane(self, v, start=None):
+        if isinstance(v, Axis):
+            return self.vec(v.position.to_tuple()), self.vec(_rot(np.array(v.direction.to_tuple()), 90))
+        z_dir = getattr(v, 'default_zdir', None)
+        if not isinstance(v, Pos) or z_dir is None:
+            raise _Unsupported(v)
+        return self.to_vector(v, start), self.to_direction(z_dir)
+
+    def add(self, rec):
+        self.records.append(rec)
+        _, self.e, _, self.t = rec.ends()
+        return rec
+
+    def ends(self, idx):
+        return self.records[idx].ends()
+
+    def apply(self, op, values):
+        if isinstance(op, (Vector, Pos, tuple)):
+            self.add(_Lines(self.e, self.to_vector(op, values=values)))
+            return
+
+        if not isinstance(op, op_data_holder) or op.name or op.reverse or op.connect:
+            raise _Unsupported(op)
+        handler = getattr(self, op.fn.__name__, None)
+        if handler is None:
+            raise _Unsupported(op)
+
+        sig, bound = _bind(op)
+        bound.apply_defaults()
+        args = dict(bound.arguments)
+        del args['lb']
+        params = list(sig.parameters)
+        for k, v in values.items():
+            args[params[k + 1] if isinstance(k, int) else k] = v
+        handler(**args)
+
+    def op_start(self, start=None, tangent=None):
+        if self.records:
+            raise _Unsupported('op_start')
+        if start is not None:
+            self.e = self.to_vector(start, np.zeros((self.size, 3)))
+        if tangent is not None:
+            self.t = _unit(self.to_direction(tangent))
+
+    def op_line(self, length=None, angle=None, dir=None, start=None, to=None,
+                until=None, tangent=None):
+        reset_tangent = start is not None
+        start = self.e if start is None else self.to_vector(start)
+
+        if to is not None and not _defined(length, until):
+            return self.add(_Lines(start, self.to_vector(to, start)))
+
+        if dir is None:
+            if to is not None:
+                dir = self.to_vector(to, start) - start
+            else:
+                if tangent is None:
+                    tangent = self.vec((1, 0, 0)) if reset_tangent else self.t
+                else:
+                    tangent = self.to_direction(tangent)
+                dir = _rot(tangent, self.arr(0 if angle is None else angle))
+        else:
+            dir = self.to_direction(dir)
+
+        if length is not None:
+            return self.add(_Lines(start, start + dir * self.arr(length)[:, None]))
+
+        if isinstance(until, Axis):
+            p = self.localize(until.position)
+            d = np.array(until.direction.to_tuple()) @ self.basis
+            # closest point of start + dir*s to the until axis
+            w = np.cross(dir, d)
+            ww = _dot(w, w)
+            if (ww < _an.EPS).any():
+                raise ValueError('Line does not intersect until axis')
+            s = _dot(np.cross(p - start, d), w) / ww
+            end = start + dir * s[:, None]
+        else:
+            o, n = self.normal_plane(until, start)
+            s = _dot(o - start, n) / _dot(dir, n)
+            end = start + dir * s[:, None]
+        return self.add(_Lines(start, end))
+
+    def op_arc(self, radius=None, size=None, to=None, tangent=True,
+               short=True, center=None, start_angle=None, start=None):
+        e = self.e if start is None else self.to_vector(start)
+
+        if tangent is True:
+            tangent = self.t
+        elif tangent is not None and tangent is not False:
+            tangent = self.to_direction(tangent)
+
+        if _defined_all(radius, size) and center is None:
+            radius, size = self.arr(radius), self.arr(size)
+            n = _rot(tangent, np.copysign(90, size))
+            c = e + _unit(n) * radius[:, None]
+            return self.add(_tangent_arc(e, tangent, c + _rot(e - c, size)))
+        elif _defined(to) and tangent is not None and tangent is not False:
+            return self.add(_tangent_arc(e, tangent, self.to_vector(to, e)))
+        elif _defined_all(to, radius) and not tangent:
+            end = self.to_vector(to, e)
+            radius = self.arr(radius)
+            length = _norm(end - e) / 2
+            if (radius**2 < length**2).any():
+                raise ValueError('Arc radius is not large enough to reach the end point.')
+            k = np.sqrt(radius**2 - length**2)
+            sagitta = np.abs(radius) - k if short else -np.abs(radius) - k
+            sagitta = np.where(radius > 0, sagitta, -sagitta)
+            sv = _rot(_unit(end - e) * np.abs(sagitta)[:, None], np.where(sagitta > 0, 90, -90))
+            return self.add(_three_point_arc(e, (end + e) * 0.5 + sv, end))
+        elif _defined_all(center, radius, size):
+            center = self.e if center is True else self.to_vector(center, e)
+            radius, size = self.arr(radius), self.arr(size)
+            sweep = np.mod(size, 360)
+            full = sweep == 0
+            start_angle = np.where(full, 0, self.arr(0 if start_angle is None else start_angle))
+            sweep = np.where(full, 360, np.where(size < 0, sweep - 360, sweep))
+            a = np.radians(start_angle)
+            start = center + np.stack([np.cos(a), np.sin(a), np.zeros_like(a)], -1) * radius[:, None]
+            return self.add(_Arcs(center, self.vec((0, 0, 1)), start, np.radians(sweep)))
+        raise _Unsupported('op_arc')
+
+    def op_close(self, both=None, end=None, start=None, mirror=None):
+        if mirror is not None:
+            raise _Unsupported('op_close(mirror)')
+        if both:
+            start = end = both
+
+        if end is not None:
+            self._close_to(end, self.e, lambda p: self.add(_Lines(self.e, p)))
+
+        if start is not None:
+            s = self.ends(0)[0]
+            self._close_to(start, s, lambda p: self.records.insert(0, _Lines(p, s)))
+
+        self.add(_Lines(self.e, self.ends(0)[0]))
+
+    def _close_to(self, target, point, add):
+        o, n = self.normal_plane(target)
+        n = _unit(n)
+        p = point - n * _dot(point - o, n)[:, None]
+        new = (_norm(p - self.e) > 1e-5) & (_norm(p - self.ends(0)[0]) > 1e-5)
+        if new.all():
+            add(p)
+        elif new.any():
+            raise _Unsupported('op_close changes shape count')
+
+    def _corners(self, count, closed, make_corner):
+        l = len(self.records)
+        if closed:
+            assert count <= l, 'vertex count should be less or equal than number of shapes'
+            sidx = l - count
+            xs = [*range(sidx, l), 0]
+        else:
+            assert count < l, 'vertex count should be less than number of shapes'
+            sidx = l - 1 - count
+            xs = list(range(sidx, l))
+
+        recs = [self.records[i] for i in xs]
+        if not all(isinstance(it, _Lines) for it in recs):
+            raise _Unsupported('only line corners are supported')
+
+        starts = [None] * len(recs)
+        ends = [None] * len(recs)
+        corners = []
+        for j, (a, b) in enumerate(zip(recs, recs[1:])):
+            _, v, _, u1 = a.ends()
+            _, _, u2, _ = b.ends()
+            if (np.abs(np.cross(u1, u2)[:, 2]) < _an.EPS).any():
+                raise _Unsupported('tangent corner')
+            ends[j], corner, starts[j + 1] = make_corner(v, u1, u2)
+            corners.append(corner)
+
+        if closed and sidx == 0:
+            starts[0], ends[0] = starts[-1], ends[0]
+            recs, starts, ends = recs[:-1], starts[:-1], ends[:-1]
+
+        pieces = []
+        for j, it in enumerate(recs):
+            p0, ta = it.p[:, 0], it.p[:, 1] - it.p[:, 0]
+            a = 0 if starts[j] is None else _dot(starts[j] - p0, ta) / _dot(ta, ta)
+            b = 1 if ends[j] is None else _dot(ends[j] - p0, ta) / _dot(ta, ta)
+            rest = np.asarray(b - a)
+            if (rest < -1e-9).any():
+                raise ValueError('Corner is too large for adjacent segments')
+            # a segment fully consumed by corners is dropped as the kernel does
+            empty = rest <= 1e-9
+            if empty.any() and not empty.all():
+                raise _Unsupported('corner consumes segment for some variants')
+            if not empty.any():
+                pieces.append(it.trimmed(starts[j], ends[j]))
+            if j < len(corners):
+                pieces.append(corners[j])
+
+        keep = self.records[1:sidx] if closed else self.records[:sidx]
+        self.records = keep
+        for it in pieces:
+            self.add(it)
+
+    def op_fillet(self, radius, count=1, closed=False):
+        radius = self.arr(radius)
+
+        def corner(v, u1, u2):
+            theta = np.arctan2(np.cross(u1, u2)[:, 2], _dot(u1, u2))
+            d = (radius * np.tan(np.abs(theta) / 2))[:, None]
+            t1, t2 = v - u1 * d, v + u2 * d
+            return t1, _tangent_arc(t1, u1, t2), t2
+
+        self._corners(count, closed, corner)
+
+    def op_chamfer(self, length, count=1, length2=None, angle=None, closed=False):
+        if _defined(length2, angle):
+            raise _Unsupported('asymmetric chamfer')
+        length = self.arr(length)[:, None]
+
+        def corner(v, u1, u2):
+            t1, t2 = v - u1 * length, v + u2 * length
+            return t1, _Lines(t1, t2), t2
+
+        self._corners(count, closed, corner)
+
+
+def _segments(shapes):
+    # fillet paths are flattened to match vectorized records
+    for it in shapes:
+        if isinstance(it, _an.Path):
+            yield from _segments(it.items)
+        else:
+            yield it
+
+
+class BatchResult:
+    """Per-variant results of :func:`build_batch`
+
+    ``records`` holds batched line/arc arrays when the program was
+    vectorized, otherwise ``lines`` holds evaluated build_lines.
+    """
+    def __init__(self, plane, size, records=None, lines=None):
+        self.plane = plane
+        self.size = size
+        self.records = records
+        self.lines = lines
+
+    @property
+    def vectorized(self):
+        return self.records is not None
+
+    @property
+    def ends(self):
+        """Segment endpoints, (N, K, 2, 3) array or list of (K, 2, 3) arrays"""
+        if self.vectorized:
+            return np.stack([np.stack(it.ends()[:2], -2) for it in self.records], 1)
+        rv = []
+        for l in self.lines:
+            ends = [_ShapeEnds.of(it) for it in _segments(l._shapes)]
+            rv.append(np.array([[it.s.to_tuple(), it.e.to_tuple()] for it in ends]))
+        return rv
+
+    @property
+    def vertices(self):
+        """Segment start points followed by the last end point"""
+        ends = self.ends
+        if self.vectorized:
+            return np.concatenate([ends[:, :, 0], ends[:, -1:, 1]], 1)
+        return [np.concatenate([it[:, 0], it[-1:, 1]]) for it in ends]
+
+    def line(self, idx):
+        if not self.vectorized:
+            return self.lines[idx]
+        rv = build_line(self.plane, analytic=True)
+        for it in self.records:
+            rv.add_shape(it.variant(idx))
+        return rv
+
+    def wire(self, idx):
+        return self.line(idx).wire()
+
+    def wires(self, indices=None):
+        if indices is None:
+            indices = range(self.size)
+        return [self.wire(it) for it in indices]
+
+
+def build_batch(ops, params, plane=Plane.XY, start=None, tangent=None, vectorize=True):
+    """Evaluate build_line ops for many parameter variants at once
+
+    ``params`` maps a slot to an array of values. Slot is an
+    ``(op_index, arg)`` pair, where ``arg`` is a positional index or an
+    argument name for ops, coordinate name ('X', 'Y', 'Z') for positions
+    and an index for tuples::
+
+        rv = build_batch([X(10), Y(5), XX(0), op_fillet(1), op_close()],
+                         {(0, 'X'): widths, (3, 'radius'): radii})
+        rv.vertices  # (N, K+1, 3)
+        rv.wires([0, 10])
+
+    Lines, arcs, op_close and line-line op_fillet/op_chamfer are
+    vectorized, other ops fall back to a per-variant build_line pass.
+    """
+    arrays = {k: np.asarray(v, dtype=float) for k, v in params.items()}
+    shape = np.broadcast_shapes(*(it.shape for it in arrays.values()))
+    size = int(shape[0]) if shape else 1
+    arrays = {k: np.broadcast_to(v, (size,)) for k, v in arrays.items()}
+
+    per_op = [{} for _ in ops]
+    for (idx, arg), v in arrays.items():
+        per_op[idx][arg] = v
+
+    if vectorize:
+        try:
+            ev = _Evaluator(plane, size)
+            if start is not None:
+                ev.e = ev.to_vector(start, np.zeros((size, 3)))
+            if tangent is not None:
+                ev.t = _unit(ev.to_direction(tangent))
+            for op, values in zip(ops, per_op):
+                ev.apply(op, values)
+        except _Unsupported:
+            pass
+        else:
+            m = np.concatenate([ev.basis, ev.origin[:, None]], 1)
+            return BatchResult(plane, size, records=[it.transform(m) for it in ev.records])
+
+    lines = []
+    for i in range(size):
+        vops = [_substitute(op, {k: float(v[i]) for k, v in values.items()})
+                for op, values in zip(ops, per_op)]
+        lines.append(build_line(start, plane, tangent, analytic=True).append(*vops))
+    return BatchResult(plane, size, lines=lines)
+
+
+class BuildResult:
+    """Result of a :func:`build_many` recipe, ``time`` is wall time in seconds"""
+    __slots__ = ('line', 'time')
+
+    def __init__(self, line, time):
+        self.line = line
+        self.time = time
+
+
+def _build_one(recipe, kwargs, trusted):
+    start = time.perf_counter()
+    with trusted_ops(trusted):
+        if callable(recipe):
+            rv = recipe()
+        else:
+            rv = build_line(**kwargs).append(*recipe)
+    return BuildResult(rv, time.perf_counter() - start)
+
+
+def _run_isolated(recipe, kwargs, trusted):
+    # build123d keeps the active builder in context vars, a fresh context
+    # per task keeps them from leaking between tasks of a worker thread
+    return contextvars.Context().run(_build_one, recipe, kwargs, trusted)
+
+
+def build_many(recipes, executor=None, max_workers=None, **kwargs):
+    """Evaluate independent build_line recipes in parallel
+
+    A recipe is a sequence of ops, appended to ``build_line(**kwargs)``,
+    or a callable without arguments. Results are returned in recipe
+    order, the first failed recipe raises::
+
+        rv = build_many([[X(w), Y(5), XX(0), op_close()] for w in widths], analytic=True)
+        rv[0].line.face(), sum(it.time for it in rv)
+
+    Recipes run on ``executor`` or on a new ThreadPoolExecutor, each in
+    its own context, so builder state isn't shared. OCC releases the GIL
+    in most algorithms, which makes threads worth it without pickling
+    shapes. The trusted_ops mode of the caller is kept. A process pool
+    works too as build_line is picklable, but recipes must be picklable
+    as well.
+    """
+    trusted = _trusted.get()
+    own = executor is None
+    if own:
+        executor = ThreadPoolExecutor(max_workers)
+    try:
+        futures = [executor.submit(_run_isolated, it, kwargs, trusted) for it in recipes]
+        return [it.result() for it in futures]
+    finally:
+        if own:
+            executor.shutdown(cancel_futures=True)
@@ -0,0 +1,131 @@
+"""Persistent cache of build_line wires and faces
+
+Entries are keyed on the op IR of a line (plus its plane, start, tangent
+and mode) and stored as binary BRep files::
+
+    cache = DiskCache('~/.cache/build123d_draft')
+    l = build_line(disk_cache=cache).append(X(10), Y(5), XX(0), op_close())
+    l.face()  # built once, loaded from the cache in later runs
+
+The key is salted with build123d, OCP and IR versions and a hash of the
+modules that build shapes, entries of other versions are never matched.
+Total size is bounded, least recently used files (by access time) are
+evicted first.
+"""
+import os
+import json
+import hashlib
+import tempfile
+import functools
+
+import OCP
+import build123d
+
+from . import ir
+from .utils import shape_to_bytes, shape_from_bytes
+
+
+@functools.lru_cache(None)
+def source_hash():
+    """Hash of the modules that build shapes, a change of ops invalidates entries"""
+    rv = hashlib.sha256()
+    for name in ('analytic', 'build_line', 'ir', 'tools', 'utils'):
+        with open(os.path.join(os.path.dirname(__file__), f'{name}.py'), 'rb') as f:
+            rv.update(f.read())
+    return rv.hexdigest()[:16]
+
+
+def version_salt():
+    ocp_version = getattr(OCP, '__version__', 'unknown')
+    return (f'build123d={build123d.__version__};OCP={ocp_version};ir={ir.IR_VERSION};'
+            f'src={source_hash()}')
+
+
+class DiskCache:
+    def __init__(self, path, max_size=256 * 2**20, salt=None):
+        self.path = os.path.expanduser(path)
+        self.max_size = max_size
+        self.salt = version_salt() if salt is None else salt
+        self.hits = 0
+        self.misses = 0
+        # running total of entry sizes, the dir is only scanned to evict
+        self.size = None
+        os.makedirs(self.path, exist_ok=True)
+
+    def recipe(self, lb):
+        """Start a key for a new build_line"""
+        rv = hashlib.sha256(self.salt.encode())
+        self._update(rv, [lb.plane, lb._start_point, lb._start_tangent, lb.analytic])
+        return rv
+
+    def add_ops(self, recipe, ops):
+        """Updated recipe key or None if ops can't be serialized"""
+        try:
+            self._update(recipe, ops)
+        except TypeError:
+            return None
+        return recipe
+
+    def _update(self, recipe, values):
+        for it in values:
+            recipe.update(json.dumps(ir.encode(it), sort_keys=True, separators=(',', ':')).encode())
+            recipe.update(b'\n')
+
+    def _file(self, key, kind):
+        return os.path.join(self.path, f'{key}.{kind}.bin')
+
+    def load(self, key, kind):
+        fname = self._file(key, kind)
+        try:
+            with open(fname, 'rb') as f:
+                data = f.read()
+            # explicit access time, filesystems are often mounted with noatime
+            os.utime(fname)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return shape_from_bytes(data)
+
+    def store(self, key, kind, shape):
+        data = shape_to_bytes(shape)
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        fname = self._file(key, kind)
+        if self.size is None:
+            self.size = sum(it[1] for it in self.entries())
+        try:
+            self.size -= os.path.getsize(fname)
+        except OSError:
+            pass
+        os.replace(tmp, fname)
+        self.size += len(data)
+        if self.size > self.max_size:
+            self.evict()
+
+    def entries(self):
+        rv = []
+        for it in os.scandir(self.path):
+            if it.name.endswith('.bin'):
+                st = it.stat()
+                rv.append((max(st.st_atime, st.st_mtime), st.st_size, it.path))
+        return rv
+
+    def evict(self):
+        entries = sorted(self.entries())
+        total = sum(it[1] for it in entries)
+        for _, size, fname in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(fname)
+            except OSError:
+                pass
+            total -= size
+        self.size = total
+
+    def clear(self):
+        for _, _, fname in self.entries():
+            os.remove(fname)
+        self.size = 0
@@ -1,27 +1,239 @@
 import math
-from itertools import chain as it_chain
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
 
 from build123d.geometry import Plane, Axis, Pos, Vector, Location
-from build123d.topology import Shape, ShapeList, Wire, Edge, Vertex
+from build123d.topology import Shape, ShapeList, Wire, Edge, Vertex, downcast
 from build123d.objects_curve import Line, IntersectingLine, BaseLineObject, TangentArc, RadiusArc, CenterArc
 from build123d.operations_sketch import make_face
 from build123d.operations_generic import mirror, sweep, fillet, chamfer
 from build123d.operations_part import extrude, revolve
-from build123d.build_enums import AngularDirection
-
-from .utils import FakeBuilder, PPos, _defined, _defined_all, param_on_point, trim_wire, assert_args, debug
+from build123d.build_enums import AngularDirection, GeomType
+from OCP.BRep import BRep_Builder, BRep_Tool
+from OCP.BRepTools import BRepTools_WireExplorer
+from OCP.TopExp import TopExp
+from OCP.TopoDS import TopoDS_Wire
+from OCP.TopAbs import TopAbs_FORWARD, TopAbs_REVERSED
+import numpy as np
+
+from .utils import (FakeBuilder, PPos, _defined, _defined_all, param_on_point, trim_wire, ArgCases,
+                    shape_to_bytes, shape_from_bytes, debug)
 from .tools import make_axis, intersection
+from . import analytic as _an
 
 b123_mirror = mirror
 
 
+def _occ(shape):
+    if isinstance(shape, _an.Curve):
+        return shape.edge()
+    return shape
+
+
+def _flipped(shape):
+    # Edge positions ignore orientation, unlike Wire and analytic curves
+    return isinstance(shape, Edge) and shape.wrapped.Orientation() == TopAbs_REVERSED
+
+
+def _reverse(shape):
+    if isinstance(shape, _an.Curve):
+        shape.reverse()
+    else:
+        shape.wrapped.Reverse()
+
+
+def _reversed(shape):
+    if isinstance(shape, _an.Curve):
+        return shape.copy().reverse()
+    # shallow copy, Shape.__copy__ deep copies the geometry
+    rv = shape.__class__.__new__(shape.__class__)
+    rv.__dict__.update(shape.__dict__)
+    rv.wrapped = downcast(shape.wrapped.Reversed())
+    return rv
+
+
+def _moved(shape, loc):
+    if isinstance(shape, _an.Curve):
+        return shape.moved(loc)
+    return loc * shape
+
+
+def _op_key(v):
+    if isinstance(v, op_data_holder):
+        return (v.fn, v.name, v.reverse, v.connect,
+                _op_key(v.args), _op_key(tuple(sorted(v.kwargs.items()))))
+    elif isinstance(v, (tuple, list)):
+        return (type(v), *map(_op_key, v))
+    elif isinstance(v, Vector):
+        return (Vector, v.to_tuple())
+    elif isinstance(v, PPos):
+        return (PPos, v._initial, _op_key(getattr(v, 'default_zdir', None)))
+    elif isinstance(v, Location):
+        return (type(v), v.to_tuple(), _op_key(getattr(v, 'default_zdir', None)))
+    elif isinstance(v, Axis):
+        return (Axis, v.position.to_tuple(), v.direction.to_tuple())
+    elif isinstance(v, Plane):
+        return (Plane, v.origin.to_tuple(), v.x_dir.to_tuple(), v.z_dir.to_tuple())
+    elif isinstance(v, Shape):
+        return (Shape, v, v.wrapped.Orientation())
+    elif isinstance(v, _an.Curve):
+        raise TypeError('Analytic curves are mutable')
+    elif isinstance(v, by_tangent):
+        return (by_tangent, _op_key(v.obj), _op_key(v.sort_by), v.idx)
+    hash(v)
+    return (type(v), v)
+
+
+class _LineState:
+    __slots__ = ('token', 'shapes', 'ends', 'chain_starts', 'named', 'start_point', 'start_tangent')
+
+    def __init__(self, lb):
+        self.token = object()
+        self.shapes = lb._shapes[:]
+        self.ends = lb._ends[:]
+        self.chain_starts = lb._chain_starts[:]
+        self.named = lb._named.copy()
+        self.start_point = lb._start_point
+        self.start_tangent = lb._start_tangent
+
+    def restore(self, lb):
+        lb._shapes = self.shapes[:]
+        lb._ends = self.ends[:]
+        lb._chain_starts = self.chain_starts[:]
+        lb._named = self.named.copy()
+        lb._start_point = self.start_point
+        lb._start_tangent = self.start_tangent
+
+
+class OpCache:
+    """LRU cache of build_line states after each applied op
+
+    A state is keyed on the op (function, args and kwargs) and the state
+    before it, so re-appending a sequence with a shared prefix resumes
+    from the last cached state. Safe to share between threads.
+    """
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            rv = self._data.get(key)
+            if rv is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._data.move_to_end(key)
+            return rv
+
+    def put(self, key, state):
+        with self._lock:
+            self._data[key] = state
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+shared_op_cache = OpCache()
+
+
+def _oriented_edges(shapes):
+    for it in shapes:
+        if isinstance(it, Edge):
+            yield it.wrapped
+        elif isinstance(it, Wire):
+            explorer = BRepTools_WireExplorer(it.wrapped)
+            while explorer.More():
+                yield explorer.Current()
+                explorer.Next()
+        else:
+            raise TypeError(it)
+
+
+def _make_wire(shapes):
+    # shapes are ordered and joined end to start: rebuild the edges on shared
+    # vertices and add them in one pass, MakeWire.Add searches every vertex
+    try:
+        edges = list(_oriented_edges(shapes))
+    except TypeError:
+        return None
+    joints = [TopExp.FirstVertex_s(edges[0], True)]
+    for a, b in zip(edges, edges[1:] + edges[:1]):
+        v, w = TopExp.LastVertex_s(a, True), TopExp.FirstVertex_s(b, True)
+        gap = BRep_Tool.Pnt_s(v).Distance(BRep_Tool.Pnt_s(w))
+        # Tolerance_s is slow to dispatch, most joints are exact
+        joined = gap <= 1e-7 or gap <= max(BRep_Tool.Tolerance_s(v), BRep_Tool.Tolerance_s(w))
+        joints.append(v if joined else None)
+    if any(v is None for v in joints[1:-1]):
+        # a gap over tolerance, leave it to the fuse
+        return None
+    closed = joints[-1] is not None
+    if closed:
+        joints[0] = joints[-1]
+    else:
+        joints[-1] = TopExp.LastVertex_s(edges[-1], True)
+
+    builder = BRep_Builder()
+    rv = TopoDS_Wire()
+    builder.MakeWire(rv)
+    for edge, v, w in zip(edges, joints, joints[1:]):
+        # an empty copy shares the curve and range, only the vertices are replaced
+        orientation = edge.Orientation()
+        copy = edge.Oriented(TopAbs_FORWARD).EmptyCopied()
+        if orientation == TopAbs_REVERSED:
+            v, w = w, v
+        builder.Add(copy, v.Oriented(TopAbs_FORWARD))
+        builder.Add(copy, w.Oriented(TopAbs_REVERSED))
+        builder.Add(rv, copy.Oriented(orientation))
+    rv.Closed(closed)
+    return Wire(rv)
+
+
+class _ShapeEnds:
+    __slots__ = ('s', 'e', 'ts', 'te')
+
+    def __init__(self, s, e, ts, te):
+        self.s = s
+        self.e = e
+        self.ts = ts
+        self.te = te
+
+    @classmethod
+    def of(cls, shape):
+        if isinstance(shape, _an.Curve):
+            return cls(*shape.ends())
+        if _flipped(shape):
+            return cls(shape @ 1, shape @ 0, -(shape % 1), -(shape % 0))
+        return cls(shape @ 0, shape @ 1, shape % 0, shape % 1)
+
+
 class build_line:
-    def __init__(self, start=None, plane=Plane.XY, tangent=None):
+    def __init__(self, start=None, plane=Plane.XY, tangent=None, analytic=False, cache=None,
+                 disk_cache=None):
         # TODO: use context to get current plane
         if isinstance(start, Plane):
             start, plane = None, start
         self.plane = plane
+        self._set_plane_matrices(plane)
+        # keep lines and arcs as analytic records, OCC edges are made on demand
+        self.analytic = analytic
         self._shapes = []
+        self._ends = []
+        self._chain_starts = []
         self._named = {}
         if start is None:
             self._start_point = plane.origin
@@ -35,20 +247,103 @@ class build_line:
 
         self._builder = FakeBuilder(plane)
 
+        # states after each op are memoized in an OpCache, True means shared_op_cache
+        self.cache = shared_op_cache if cache is True else cache
+        self._state_key = None
+        if self.cache is not None:
+            self._state_key = (_op_key(plane), self._start_point.to_tuple(),
+                               self._start_tangent.to_tuple(), analytic)
+
+        # wires and faces are stored in a brep_cache.DiskCache keyed on appended ops
+        self.disk_cache = disk_cache
+        self._recipe = None
+        if disk_cache is not None:
+            self._recipe = disk_cache.recipe(self)
+
+    def __getstate__(self):
+        # shapes go as binary BRep, shapes shared by _shapes and _named are stored once
+        state = self.__dict__.copy()
+        for k in ('_matrix', '_inverse', '_identity', '_builder', '_ends', '_state_key', '_recipe'):
+            del state[k]
+        plane = self.plane
+        state['plane'] = plane.origin.to_tuple(), plane.x_dir.to_tuple(), plane.z_dir.to_tuple()
+        state['_start_point'] = self._start_point.to_tuple()
+        state['_start_tangent'] = self._start_tangent.to_tuple()
+        if self.cache is not None:
+            state['cache'] = True if self.cache is shared_op_cache else self.cache.maxsize
+
+        shapes, index = [], {}
+        for it in self._shapes + list(self._named.values()):
+            if id(it) not in index:
+                index[id(it)] = len(shapes)
+                shapes.append(it)
+        state['_shapes'] = len(self._shapes), [
+            it if isinstance(it, _an.Curve) else (shape_to_bytes(it), getattr(it, '_lb_name', None))
+            for it in shapes]
+        state['_named'] = {k: index[id(v)] for k, v in self._named.items()}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.plane = Plane(*state['plane'])
+        self._set_plane_matrices(self.plane)
+        self._start_point = Vector(state['_start_point'])
+        self._start_tangent = Vector(state['_start_tangent'])
+        self._builder = FakeBuilder(self.plane)
+        cache = state['cache']
+        if cache is not None:
+            self.cache = shared_op_cache if cache is True else OpCache(cache)
+        self._state_key = None
+        self._recipe = None
+
+        count, shapes = state['_shapes']
+        for i, it in enumerate(shapes):
+            if not isinstance(it, _an.Curve):
+                data, name = it
+                it = shapes[i] = shape_from_bytes(data)
+                if name is not None:
+                    it._lb_name = name
+        self._shapes = shapes[:count]
+        self._ends = [None] * count
+        self._named = {k: shapes[v] for k, v in state['_named'].items()}
+
+    def _set_plane_matrices(self, plane):
+        # plane local -> global 4x4 matrix and its inverse
+        m = np.identity(4)
+        m[:3, 0] = plane.x_dir.to_tuple()
+        m[:3, 1] = plane.y_dir.to_tuple()
+        m[:3, 2] = plane.z_dir.to_tuple()
+        m[:3, 3] = plane.origin.to_tuple()
+        self._matrix = m
+        self._inverse = np.linalg.inv(m)
+        self._identity = np.array_equal(m, np.identity(4))
+
+    def _to_global(self, v):
+        if self._identity:
+            return Vector(v)
+        m = self._matrix
+        return Vector(*(m[:3, :3] @ v.to_tuple() + m[:3, 3]).tolist())
+
+    def _to_local(self, v):
+        if self._identity:
+            return Vector(v)
+        m = self._inverse
+        return Vector(*(m[:3, :3] @ v.to_tuple() + m[:3, 3]).tolist())
+
     def to_vector(self, v, ref=None):
         if isinstance(v, Pos):
             if ref is None:
                 ref = self.e
-            ref = ref.transform(self.plane.forward_transform)
+            ref = self._to_local(ref)
             if isinstance(v, PPos):
                 rv = v.combine_abs(ref)
             else:
                 rv = v.position + ref
-            return rv.transform(self.plane.reverse_transform)
+            return self._to_global(rv)
         if isinstance(v, Axis):
-            return v.position.transform(self.plane.reverse_transform)
+            return self._to_global(v.position)
         elif isinstance(v, tuple):
-            return Vector(*v).transform(self.plane.reverse_transform)
+            return self._to_global(Vector(*v))
 
         return v
 
@@ -59,93 +354,204 @@ class build_line:
         if isinstance(v, Vector):
             return v
         elif isinstance(v, Axis):
-            return v.located(self.plane.location).direction
-        elif isinstance(v, tuple):
-            origin = self.to_vector((0, 0, 0))
-            return self.to_vector(v) - origin
+            v = v.direction.to_tuple()
+        elif not isinstance(v, tuple):
+            assert False, f'Unsupported type {type(v)}'
 
-        assert False, f'Unsupported type {type(v)}'
+        v = Vector(*v)
+        if self._identity:
+            return v
+        return Vector(*(self._matrix[:3, :3] @ v.to_tuple()).tolist())
+
+    def _add_points(self, ops, start, end):
+        # a run of point ops: resolve in plane coordinates, transform at once
+        e = self._to_local(self.e)
+        points = []
+        for op in ops[start:end]:
+            if isinstance(op, Vector):
+                e = self._to_local(op)
+            elif isinstance(op, PPos):
+                e = op.combine_abs(e)
+            elif isinstance(op, Pos):
+                e = op.position + e
+            else:
+                e = Vector(*op)
+            points.append(e.to_tuple())
+
+        if not self._identity:
+            m = self._matrix
+            points = (np.array(points) @ m[:3, :3].T + m[:3, 3]).tolist()
+        for idx, p in enumerate(points, start):
+            try:
+                self.add_shape(_line(self, self.e, Vector(*p)))
+            except Exception as e:
+                raise Exception(f'Error applying {ops[idx]}#{idx}: {e}') from e
 
     def apply(self, op):
+        # only ops passed to append() are recorded for disk_cache
+        self._recipe = None
+        self._state_key = None
+        self._apply(op)
+
+    def _apply(self, op):
+        if _profiler is not None:
+            return _profiler.record(self, op, self._apply_op)
+        self._apply_op(op)
+
+    def _apply_op(self, op):
         if isinstance(op, (Vector, Pos, tuple)):
             v = self.to_vector(op)
-            self._shapes.append(Line(self.e, v))
+            self.add_shape(_line(self, self.e, v))
         elif isinstance(op, Shape):
-            self._shapes.append(op)
+            self.add_shape(op)
         else:
             s = op.fn(self, *op.args, **op.kwargs)
             if op.name:
                 s._lb_name = op.name
                 self._named[op.name] = s
             if op.reverse:
-                chains = self.chains()
-                for it in chains[-1]:
-                    it.wrapped.Reverse()
-                rv = list(it_chain.from_iterable(chains[:-1]))
+                idx = self._chain_starts[-1]
+                self._replace_each(idx, _reversed)
                 # rv.extend(reversed_wire(it) for it in reversed(chains[-1]))
-                rv.extend(reversed(chains[-1]))
-                self._shapes = rv
-            if op.connect:
-                chains = self.chains()
-                if len(chains) > 1:
-                    rv = list(it_chain.from_iterable(chains[:-1]))
-                    rv.append(Line(rv[-1].e, chains[-1][0].s))
-                    rv.extend(chains[-1])
-                    self._shapes = rv
+                tail = self._shapes[idx:]
+                tail.reverse()
+                self._replace_tail(idx, tail)
+            if op.connect and len(self._chain_starts) > 1:
+                idx = self._chain_starts[-1]
+                self.insert_shape(idx, _line(self, self._ends_at(idx-1).e, self._ends_at(idx).s))
 
     def append(self, *ops):
+        recipe, self._recipe = self._recipe, None
+        self._append(ops)
+        if recipe is not None:
+            self._recipe = self.disk_cache.add_ops(recipe, ops)
+        return self
+
+    def _append(self, ops):
+        if self.cache is None:
+            idx = 0
+            while idx < len(ops):
+                end = idx
+                while end < len(ops) and isinstance(ops[end], (Vector, Pos, tuple)):
+                    end += 1
+                if end - idx > 1 and _profiler is None:
+                    self._add_points(ops, idx, end)
+                    idx = end
+                    continue
+
+                try:
+                    self._apply(ops[idx])
+                except Exception as e:
+                    raise Exception(f'Error applying {ops[idx]}#{idx}: {e}') from e
+                idx += 1
+            return self
+
+        cache, key, hit = self.cache, self._state_key, None
+        self._state_key = None
         for idx, op in enumerate(ops):
+            if key is not None:
+                try:
+                    key = (key, _op_key(op))
+                except TypeError:
+                    key = None
+                else:
+                    state = cache.get(key)
+                    if state is not None:
+                        # restore lazily, only the last state of a matching prefix
+                        hit, key = state, state.token
+                        continue
+
+            if hit is not None:
+                hit.restore(self)
+                hit = None
+
             try:
-                self.apply(op)
+                self._apply(op)
             except Exception as e:
                 raise Exception(f'Error applying {op}#{idx}: {e}') from e
+
+            if key is not None:
+                state = _LineState(self)
+                cache.put(key, state)
+                key = state.token
+
+        if hit is not None:
+            hit.restore(self)
+        self._state_key = key
         return self
 
     @property
     def e(self):
         if self._shapes:
-            return self._shapes[-1] @ 1
+            return self._ends_at(-1).e
         else:
             return self._start_point
 
     @property
     def s(self):
-        return self._shapes[0] @ 0
+        return self._ends_at(0).s
 
     @property
     def ss(self):
-        return self._shapes[0] @ 1
+        return self._ends_at(0).e
 
     @property
     def ee(self):
-        return self._shapes[-1] @ 0
+        return self._ends_at(-1).s
+
+    def _disk_cached(self, kind, build):
+        if self._recipe is None:
+            return build()
+        key = self._recipe.hexdigest()
+        rv = self.disk_cache.load(key, kind)
+        if rv is None:
+            rv = build()
+            self.disk_cache.store(key, kind, rv)
+        return rv
 
     def wire(self):
-        if len(self._shapes) == 1:
-            return self._shapes[0]
-        return self._shapes[0] + self._shapes[1:]
+        return self._disk_cached('wire', self._wire)
+
+    def _wire(self):
+        shapes = self[:]
+        if len(shapes) == 1:
+            return shapes[0]
+        if self._chain_starts == [0]:
+            rv = _make_wire(shapes)
+            if rv is not None:
+                return rv
+        return shapes[0] + shapes[1:]
 
     def edges(self) -> ShapeList[Edge]:
         return ShapeList([
-            e for shape in self._shapes for e in shape.edges()])
+            e for shape in self[:] for e in shape.edges()])
 
     def face(self):
-        return make_face(self.wire())
+        return self._disk_cached('face', lambda: make_face(self.wire()))
 
     def tangent(self, shape_idx=-1, param=1):
         if self._shapes:
-            return self._shapes[shape_idx].tangent_at(param)
+            if param == 1:
+                return self._ends_at(shape_idx).te
+            elif param == 0:
+                return self._ends_at(shape_idx).ts
+            shape = self[shape_idx]
+            if _flipped(shape):
+                return -shape.tangent_at(1 - param)
+            return shape.tangent_at(param)
         return self._start_tangent
 
     def normal(self, shape_idx=-1, param=1):
-        if self._shapes:
-            t = self._shapes[shape_idx].tangent_at(param)
-        else:
-            t = self._start_tangent
-        return t.rotate(make_axis(self.plane), 90)
+        return self.tangent(shape_idx, param).rotate(make_axis(self.plane), 90)
 
     def normal_loc(self, shape_idx=-1, param=1, tangent=1):
-        p = self._shapes[shape_idx] @ param
+        if param == 1:
+            p = self._ends_at(shape_idx).e
+        elif param == 0:
+            p = self._ends_at(shape_idx).s
+        else:
+            shape = self[shape_idx]
+            p = shape @ (1 - param if _flipped(shape) else param)
         t = tangent * self.tangent(shape_idx, param)
         n = t.rotate(make_axis(self.plane), 90)
         return Location(Plane(p, x_dir=t, z_dir=n))
@@ -162,26 +568,123 @@ class build_line:
                 Axis(self.plane.origin, self.plane.z_dir), 90)
             return Plane(gaxis.position, z_dir=n)
 
+    def _ends_at(self, idx):
+        rv = self._ends[idx]
+        if rv is None:
+            rv = self._ends[idx] = _ShapeEnds.of(self._shapes[idx])
+        return rv
+
+    def _joined(self, idx):
+        return idx > 0 and self._ends_at(idx-1).e == self._ends_at(idx).s
+
+    def _update_chain_start(self, idx):
+        if idx >= len(self._shapes):
+            return
+        starts = self._chain_starts
+        pos = bisect_left(starts, idx)
+        present = pos < len(starts) and starts[pos] == idx
+        if self._joined(idx):
+            if present:
+                del starts[pos]
+        elif not present:
+            starts.insert(pos, idx)
+
+    def _shift_chain_starts(self, idx, delta):
+        starts = self._chain_starts
+        for i in range(bisect_left(starts, idx), len(starts)):
+            starts[i] += delta
+
+    def _reindex(self, idx=0):
+        starts = self._chain_starts
+        del starts[bisect_left(starts, idx):]
+        for i in range(idx, len(self._shapes)):
+            if not self._joined(i):
+                starts.append(i)
+
+    def _replace_tail(self, idx, shapes):
+        _count_stored(shapes)
+        self._shapes[idx:] = shapes
+        self._ends[idx:] = [None] * len(shapes)
+        self._reindex(idx)
+
+    def _replace_each(self, idx, fn):
+        # shapes are replaced, not mutated: cached states share them
+        for i in range(idx, len(self._shapes)):
+            o = self._shapes[i]
+            n = self._shapes[i] = fn(o)
+            _count_stored((n,))
+            name = getattr(o, '_lb_name', None)
+            if name is not None:
+                n._lb_name = name
+                self._named[name] = n
+
+    def _reset_ends(self, idx=0):
+        for i in range(idx, len(self._ends)):
+            self._ends[i] = None
+
     def add_shape(self, shape):
+        self._state_key = None
+        self._recipe = None
+        _count_stored((shape,))
         self._shapes.append(shape)
+        self._ends.append(_ShapeEnds.of(shape))
+        if not self._joined(len(self._shapes) - 1):
+            self._chain_starts.append(len(self._shapes) - 1)
         return shape
 
+    def insert_shape(self, idx, shape):
+        idx = range(len(self._shapes) + 1)[idx]
+        self._state_key = None
+        self._recipe = None
+        _count_stored((shape,))
+        self._shapes.insert(idx, shape)
+        self._ends.insert(idx, _ShapeEnds.of(shape))
+        self._shift_chain_starts(idx, 1)
+        self._update_chain_start(idx)
+        self._update_chain_start(idx + 1)
+        return shape
+
+    def set_shape(self, idx, shape):
+        idx = range(len(self._shapes))[idx]
+        self._state_key = None
+        self._recipe = None
+        _count_stored((shape,))
+        self._shapes[idx] = shape
+        self._ends[idx] = _ShapeEnds.of(shape)
+        self._update_chain_start(idx)
+        self._update_chain_start(idx + 1)
+        return shape
+
+    def pop_shape(self, idx=-1):
+        idx = range(len(self._shapes))[idx]
+        self._state_key = None
+        self._recipe = None
+        rv = self._shapes.pop(idx)
+        self._ends.pop(idx)
+        starts = self._chain_starts
+        pos = bisect_left(starts, idx)
+        if pos < len(starts) and starts[pos] == idx:
+            del starts[pos]
+        self._shift_chain_starts(idx, -1)
+        self._update_chain_start(idx)
+        return rv
+
     def move(self, loc):
         if isinstance(loc, (tuple, Vector)):
             loc = Pos(loc)
-        old = self._shapes
-        self._shapes = [loc * it for it in self._shapes]
-
-        for o, n in zip(old, self._shapes):
-            if hasattr(o, '_lb_name'):
-                self._named[o._lb_name] = n
+        self._replace_each(0, lambda it: _moved(it, loc))
+        self._reset_ends()
+        self._state_key = None
+        self._recipe = None
 
     def __getitem__(self, idx):
-        return self._shapes[idx]
+        if isinstance(idx, slice):
+            return [_occ(it) for it in self._shapes[idx]]
+        return _occ(self._shapes[idx])
 
     def __getattr__(self, name):
         try:
-            return self._named[name]
+            return _occ(self._named[name])
         except KeyError:
             raise AttributeError(name)
 
@@ -202,21 +705,18 @@ class build_line:
         return extrude(self.face(), amount, both=both, dir=dir)
 
     def chains(self):
+        bounds = [*self._chain_starts, len(self._shapes)]
+        return [self[s:e] for s, e in zip(bounds, bounds[1:])]
+
+    def last_chain(self):
         if not self._shapes:
             return []
-
-        rv = [c := [self._shapes[0]]]
-        for s in self._shapes[1:]:
-            if c[-1].e != s.s:
-                c = [s]
-                rv.append(c)
-            else:
-                c.append(s)
-
-        return rv
+        return self[self._chain_starts[-1]:]
 
 
 class op_data_holder:
+    __slots__ = ('fn', 'name', 'reverse', 'connect', 'args', 'kwargs')
+
     def __init__(self, fn, name, reverse, connect, args, kwargs):
         self.fn = fn
         self.name = name
@@ -232,12 +732,50 @@ class op_data_holder:
         return f'{self.fn.__name__}({", ".join(params)})'
 
 
+_trusted = ContextVar('build_line_trusted', default=False)
+
+# process-wide op recorder, see profiling.profile()
+_profiler = None
+
+
+def _set_profiler(profiler):
+    global _profiler
+    rv, _profiler = _profiler, profiler
+    return rv
+
+
+def _count_stored(shapes):
+    if _profiler is not None:
+        _profiler.stored(shapes)
+
+
+@contextmanager
+def trusted_ops(enabled=True):
+    """Skip argument validation of ops created in this context
+
+    For generated op streams which are already validated.
+    """
+    token = _trusted.set(enabled)
+    try:
+        yield
+    finally:
+        _trusted.reset(token)
+
+
+# op functions by name, used to restore serialized ops
+op_registry = {}
+
+
 def build_line_op(fn):
+    op_registry[fn.__name__] = fn
+
     def inner(*args, **kwargs):
         name = kwargs.pop('name', None)
         reverse = kwargs.pop('reverse', False)
         connect = kwargs.pop('connect', False)
-        fn(None, *args, **kwargs)
+        if not _trusted.get():
+            # validate arguments
+            fn(None, *args, **kwargs)
         return op_data_holder(fn, name, reverse, connect, args, kwargs)
     return inner
 
@@ -254,17 +792,19 @@ def op_start(lb, start=None, tangent=None):
         lb._start_tangent = lb.to_direction(tangent)
 
 
+_line_args = ArgCases(
+    ['dir', ('length', 'until')],
+    ['angle', ('length', 'until')],
+    ['to', (None, 'length', 'until')],
+    [('length', 'until'), '-dir', '-angle', '-to'],
+)
+
+
 @build_line_op
 def op_line(lb, length=None, angle=None, dir=None, start=None, to=None,
             until=None, tangent=None):
     if lb is None:
-        assert_args(
-            locals(),
-            ['dir', ('length', 'until')],
-            ['angle', ('length', 'until')],
-            ['to', (None, 'length', 'until')],
-            [('length', 'until'), '-dir', '-angle', '-to'],
-        )
+        _line_args(locals())
         return
 
     reset_tangent = False
@@ -275,7 +815,7 @@ def op_line(lb, length=None, angle=None, dir=None, start=None, to=None,
         start = lb.to_vector(start)
 
     if to is not None and not _defined(length, until):
-        return lb.add_shape(Line(start, lb.to_vector(to, start)))
+        return lb.add_shape(_line(lb, start, lb.to_vector(to, start)))
 
     if dir is None:
         if to is not None:
@@ -293,7 +833,7 @@ def op_line(lb, length=None, angle=None, dir=None, start=None, to=None,
         dir = lb.to_direction(dir)
 
     if length is not None:
-        return lb.add_shape(Line(start, start + dir * length))
+        return lb.add_shape(_line(lb, start, start + dir * length))
 
     return lb.add_shape(_until_helper(lb, start, dir, until))
 
@@ -304,48 +844,102 @@ def _until_helper(lb, start, dir, until):
 
     if isinstance(until, (Axis, Plane)):
         to = Axis(start, dir).intersect(until)
-        return Line(start, to)
+        return _line(lb, start, to)
 
     return IntersectingLine(start, dir, until)
 
 
+def _line(lb, start, end):
+    if lb.analytic:
+        return _an.Segment(start, end)
+    return Line(start, end)
+
+
+def _tangent_arc(lb, start, tangent, end):
+    if lb.analytic:
+        return _an.tangent_arc(start, tangent, end)
+    return TangentArc(start, end, tangent=tangent)
+
+
+def _radius_arc(lb, start, end, radius, short):
+    if not lb.analytic:
+        return RadiusArc(start, end, radius, short_sagitta=short)
+
+    # same construction as RadiusArc -> SagittaArc
+    length = (end - start).length / 2
+    try:
+        if short:
+            sagitta = abs(radius) - math.sqrt(radius**2 - length**2)
+        else:
+            sagitta = -abs(radius) - math.sqrt(radius**2 - length**2)
+    except ValueError as e:
+        raise ValueError('Arc radius is not large enough to reach the end point.') from e
+
+    if radius <= 0:
+        sagitta = -sagitta
+    sv = (end - start).normalized() * abs(sagitta)
+    sv = sv.rotate(make_axis(lb.plane), 90 if sagitta > 0 else -90)
+    return _an.three_point_arc(start, (end + start) * 0.5 + sv, end)
+
+
+def _center_arc(lb, center, radius, start_angle, size):
+    if not lb.analytic:
+        return CenterArc(center, radius, start_angle, size)
+
+    # same angle normalization as CenterArc
+    sweep = size % 360
+    if sweep == 0:
+        start_angle, sweep = 0, 360
+    elif size < 0:
+        sweep -= 360
+
+    a = math.radians(start_angle)
+    x_dir, z_dir = lb.plane.x_dir, lb.plane.z_dir
+    start = center + (x_dir * math.cos(a) + z_dir.cross(x_dir) * math.sin(a)) * radius
+    return _an.Arc(center, z_dir, start, math.radians(sweep))
+
+
 @build_line_op
 def op_extend(lb, start=None, end=None):
     if lb is None:
         return
 
-    l = lb._shapes.pop()
+    le = lb._ends_at(-1)
+    l = lb.pop_shape()
     segments = [l]
     if start is not None:
         if isinstance(start, (int, float)):
-            nl = Line(l @ 0 - l.tangent_at(0) * start, l @ 0)
+            nl = _line(lb, le.s - le.ts * start, le.s)
         else:
-            nl = _until_helper(lb, l @ 0, l.tangent_at(0), start)
-            nl.wrapped.Reverse()
+            nl = _until_helper(lb, le.s, le.ts, start)
+            _reverse(nl)
         segments = [nl, *segments]
 
     if end is not None:
         if isinstance(end, (int, float)):
-            nl = Line(l @ 1, l @ 1 + l.tangent_at(1) * end)
+            nl = _line(lb, le.e, le.e + le.te * end)
         else:
-            nl = _until_helper(lb, l @ 1, l.tangent_at(1), end)
+            nl = _until_helper(lb, le.e, le.te, end)
         segments = [*segments, nl]
 
-    lb._shapes.extend(segments)
+    for it in segments:
+        lb.add_shape(it)
     return l
 
 
+_arc_args = ArgCases(
+    ['radius', 'size', '+tangent', '-center', '-to'],
+    ['to', '+tangent', '-center', '-radius', '-size'],
+    ['to', 'radius', '!tangent', '-center'],
+    ['center', 'radius', 'size', (None, 'start_angle'), '-to'],
+)
+
+
 @build_line_op
 def op_arc(lb, radius=None, size=None, to=None, tangent=True,
            short=True, center=None, start_angle=None, start=None):
     if lb is None:
-        assert_args(
-            locals(),
-            ['radius', 'size', '+tangent', '-center', '-to'],
-            ['to', '+tangent', '-center', '-radius', '-size'],
-            ['to', 'radius', '!tangent', '-center'],
-            ['center', 'radius', 'size', (None, 'start_angle'), '-to'],
-        )
+        _arc_args(locals())
         return
 
     if start is None:
@@ -365,18 +959,20 @@ def op_arc(lb, radius=None, size=None, to=None, tangent=True,
             n = tangent.rotate(ax, math.copysign(90, size))
             c = e + n.normalized() * radius
             ep = c + (e - c).rotate(ax, size)
+            if lb.analytic:
+                return lb.add_shape(_an.tangent_arc(e, tangent, ep))
             return lb.add_shape(BaseLineObject(Edge.make_tangent_arc(e, tangent, ep)))
         elif _defined(to) and tangent:
-            return lb.add_shape(TangentArc(e, lb.to_vector(to, e), tangent=tangent))
+            return lb.add_shape(_tangent_arc(lb, e, tangent, lb.to_vector(to, e)))
         elif _defined_all(to, radius) and not tangent:
-            return lb.add_shape(RadiusArc(e, lb.to_vector(to, e), radius, short_sagitta=short))
+            return lb.add_shape(_radius_arc(lb, e, lb.to_vector(to, e), radius, short))
         elif _defined_all(center, radius, size):
             start_angle = start_angle or 0
             if center is True:
                 center = lb.e
             else:
                 center = lb.to_vector(center, e)
-            return lb.add_shape(CenterArc(center, radius, start_angle, size))
+            return lb.add_shape(_center_arc(lb, center, radius, start_angle, size))
 
     assert False
 
@@ -409,7 +1005,7 @@ def op_drop(lb, idx=0):
     if not lb:
         return
 
-    lb._shapes.pop(idx)
+    lb.pop_shape(idx)
 
 
 @build_line_op
@@ -432,24 +1028,24 @@ def op_close(lb, both=None, end=None, start=None, mirror=None):
     if end is not None:
         p = lb.e.project_to_plane(end)
         if p not in (lb.e, lb.s):
-            lb.add_shape(Line(lb.e, p))
+            lb.add_shape(_line(lb, lb.e, p))
 
     if start is not None:
         p = lb.s.project_to_plane(start)
         if p not in (lb.e, lb.s):
-            lb._shapes = [Line(p, lb.s), *lb._shapes]
+            lb.insert_shape(0, _line(lb, p, lb.s))
 
     if mirror is not None:
         return lb.add_shape(b123_mirror(lb.wire(), start))
 
-    return lb.add_shape(Line(lb.e, lb.s))
+    return lb.add_shape(_line(lb, lb.e, lb.s))
 
 
 @build_line_op
 def op_trim(lb, point, near_by=None, add=False):
     if not lb:
         return
-    s = lb._shapes[-1]
+    s = lb[-1]
     other = None
     if isinstance(point, by_tangent):
         rv, other = point.trim(lb)
@@ -457,9 +1053,9 @@ def op_trim(lb, point, near_by=None, add=False):
         if isinstance(point, Axis):
             ax = point.located(lb.plane.location)
             point = intersection(s, ax, near_by=near_by)
-            other = Line(point, ax.position)
+            other = _line(lb, point, ax.position)
         param = param_on_point(s, point)
-        rv = lb._shapes[-1] = trim_wire(s, end=param)
+        rv = lb.set_shape(-1, trim_wire(s, end=param))
 
     if other is not None and add:
         lb.add_shape(other)
@@ -472,16 +1068,17 @@ def op_move(lb, start=None, end=None):
     if not lb:
         return
 
-    targets = lb.chains()[-1]
+    idx = lb._chain_starts[-1]
     if start is not None:
         start = lb.to_vector(start)
-        pos = Pos(start - targets[0].s)
+        pos = Pos(start - lb._ends_at(idx).s)
     elif end is not None:
         end = lb.to_vector(end)
-        pos = Pos(end - targets[-1].e)
+        pos = Pos(end - lb.e)
 
-    for it in targets:
-        it.move(pos)
+    lb._replace_each(idx, lambda it: _moved(it, pos))
+    lb._reset_ends(idx)
+    lb._update_chain_start(idx)
 
 
 class by_tangent:
@@ -491,16 +1088,17 @@ class by_tangent:
         self.idx = idx
 
     def trim(self, lb):
-        s = lb._shapes[-1]
-        cl = Line(s.edge().arc_center, self.point)
+        s = lb[-1]
+        point = lb.to_vector(self.obj)
+        cl = Line(s.edge().arc_center, point)
         cc = Pos(cl @ 0.5) * Edge.make_circle(cl.length/2)
         ip = intersection(s, cc, sort_by=self.sort_by, idx=self.idx)
         param = param_on_point(s, ip)
-        rv = lb._shapes[-1] = trim_wire(s, end=param)
-        return rv, Line(rv @ 1, lb.to_vector(self.obj))
+        rv = lb.set_shape(-1, trim_wire(s, end=param))
+        return rv, _line(lb, rv @ 1, point)
 
 
-def _fillet_helper(lb: build_line, count: int, closed: bool) -> tuple[int, list[Vertex], list[Wire]]:
+def _fillet_range(lb: build_line, count: int, closed: bool) -> tuple[int, list[int]]:
     l = len(lb._shapes)
     if closed:
         assert count <= l, f"vertex count should be less or equal than number of shapes"
@@ -509,32 +1107,100 @@ def _fillet_helper(lb: build_line, count: int, closed: bool) -> tuple[int, list[
 
     if closed:
         sidx = l - count
-        xs = [*range(sidx, l), 0]
-        keep = lb._shapes[1:sidx]
-    else:
-        sidx = l - 1 - count
-        xs = list(range(sidx, l))
-        keep = lb._shapes[:sidx]
+        return sidx, [*range(sidx, l), 0]
+    sidx = l - 1 - count
+    return sidx, list(range(sidx, l))
+
 
-    to_fuse = [lb._shapes[i] for i in xs]
-    fpoints = [it.at(1) for it in to_fuse[:-1]]
+def _fillet_helper(lb: build_line, count: int, closed: bool) -> tuple[int, list[Vertex]]:
+    sidx, xs = _fillet_range(lb, count, closed)
+    to_fuse = [lb[i] for i in xs]
+    fpoints = [lb._ends_at(i).e for i in xs[:-1]]
     fused = to_fuse[0].fuse(*to_fuse[1:])
     w = Wire(fused.edges())
     vlist = [v for v in w.vertices() if Vector(v) in fpoints]
-    return sidx, vlist, keep
+    return sidx, vlist
+
+
+def _as_curves(shape):
+    if isinstance(shape, _an.Path):
+        return shape.items
+    elif isinstance(shape, _an.Curve):
+        return [shape]
+    elif isinstance(shape, Edge) and not shape.is_closed:
+        ends = _ShapeEnds.of(shape)
+        if shape.geom_type == GeomType.LINE:
+            return [_an.Segment(ends.s, ends.e)]
+        elif shape.geom_type == GeomType.CIRCLE:
+            return [_an.three_point_arc(ends.s, shape @ 0.5, ends.e)]
+
+
+def _analytic_corners(lb: build_line, count: int, closed: bool, corner) -> tuple[int, _an.Path]:
+    # corners between lines and arcs are computed in closed form, no fuse is needed
+    sidx, xs = _fillet_range(lb, count, closed)
+    ring = closed and sidx == 0
+    if ring:
+        xs.pop()
+
+    pieces = []  # [curve, start param, end param, corner curve after it]
+    joints = []
+    for i in xs:
+        items = _as_curves(lb._shapes[i])
+        if items is None:
+            return None
+        if pieces:
+            joints.append(len(pieces) - 1)
+        if len(items) > 2:
+            # only end items meet corners, inner ones of a long path pass as is
+            pieces.extend(([items[0], 0, 1, None], [items[1:-1], None, None, None],
+                           [items[-1], 0, 1, None]))
+        else:
+            pieces.extend([it, 0, 1, None] for it in items)
+    if ring:
+        joints.append(len(pieces) - 1)
+
+    for j in joints:
+        a, b = pieces[j], pieces[(j + 1) % len(pieces)]
+        rv = corner(a[0], b[0])
+        if rv is None:
+            return None
+        a[2], b[1], a[3] = rv
+
+    items = []
+    for it, u0, u1, extra in pieces:
+        if u0 is None:
+            items.extend(it)
+            continue
+        if u0 < -1e-7 or u1 > 1 + 1e-7 or u1 - u0 < -1e-7:
+            return None
+        if u1 - u0 > 1e-7:
+            items.append(it if (u0, u1) == (0, 1) else it.trimmed(u0, u1))
+        if extra is not None:
+            items.append(extra)
+    return sidx, _an.Path(items)
+
+
+def _replace_fused(lb: build_line, sidx: int, closed: bool, fobj: Wire):
+    lb._replace_tail(sidx, [fobj])
+    if closed and sidx > 0:
+        lb.pop_shape(0)
 
 
 @build_line_op
 def op_fillet(lb, radius, count=1, closed=False):
     if not lb:
         return
-    sidx, vlist, keep = _fillet_helper(lb, count, closed)
-    spoint = lb._shapes[sidx] @ 0
-    fobj = fillet(vlist, radius)
-    if not closed and fobj @ 0 != spoint:
-        fobj.wrapped.Reverse()
-    keep.append(fobj)
-    lb._shapes = keep
+    normal = _an.as_array(lb.plane.z_dir)
+    rv = _analytic_corners(lb, count, closed, lambda a, b: _an.fillet(a, b, radius, normal))
+    if rv is not None:
+        sidx, fobj = rv
+    else:
+        sidx, vlist = _fillet_helper(lb, count, closed)
+        spoint = lb._ends_at(sidx).s
+        fobj = fillet(vlist, radius)
+        if not closed and fobj @ 0 != spoint:
+            fobj.wrapped.Reverse()
+    _replace_fused(lb, sidx, closed, fobj)
     return fobj
 
 
@@ -542,11 +1208,17 @@ def op_fillet(lb, radius, count=1, closed=False):
 def op_chamfer(lb, length, count=1, length2=None, angle=None, closed=False):
     if not lb:
         return
-    sidx, vlist, keep = _fillet_helper(lb, count, closed)
-    spoint = lb._shapes[sidx] @ 0
-    fobj = chamfer(vlist, length=length, length2=length2, angle=angle)
-    if fobj @ 0 != spoint:
-        fobj.wrapped.Reverse()
-    keep.append(fobj)
-    lb._shapes = keep
+    rv = None
+    if length2 is None and angle is None:
+        normal = _an.as_array(lb.plane.z_dir)
+        rv = _analytic_corners(lb, count, closed, lambda a, b: _an.chamfer(a, b, length, normal))
+    if rv is not None:
+        sidx, fobj = rv
+    else:
+        sidx, vlist = _fillet_helper(lb, count, closed)
+        spoint = lb._ends_at(sidx).s
+        fobj = chamfer(vlist, length=length, length2=length2, angle=angle)
+        if fobj @ 0 != spoint:
+            fobj.wrapped.Reverse()
+    _replace_fused(lb, sidx, closed, fobj)
     return fobj
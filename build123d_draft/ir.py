@@ -0,0 +1,143 @@
+"""Serializable representation of build_line op sequences
+
+Ops and their arguments are converted into plain JSON values::
+
+    doc = to_ir([X(10), op_arc(5, 90), op_close()])
+    ops = from_ir(doc)
+    s = dumps(ops)
+    ops_hash(ops)  # content hash of the canonical JSON
+
+Shapes can't be represented and raise TypeError.
+"""
+import json
+import hashlib
+
+from OCP.gp import gp_Trsf
+from OCP.TopLoc import TopLoc_Location
+from build123d.geometry import Vector, Location, Pos, Axis, Plane
+
+from .utils import PPos
+from .analytic import location_matrix
+from .build_line import op_data_holder, op_registry, by_tangent
+
+IR_VERSION = 1
+
+
+def _vec(v):
+    return list(Vector(v).to_tuple())
+
+
+def encode(v):
+    if v is None or isinstance(v, (bool, int, float, str)):
+        return v
+    elif isinstance(v, tuple):
+        return [encode(it) for it in v]
+    elif isinstance(v, list):
+        return {'$': 'list', 'v': [encode(it) for it in v]}
+    elif isinstance(v, dict):
+        return {'$': 'dict', 'v': {k: encode(it) for k, it in v.items()}}
+    elif isinstance(v, op_data_holder):
+        rv = {'$': 'op', 'fn': v.fn.__name__}
+        if v.args:
+            rv['args'] = [encode(it) for it in v.args]
+        if v.kwargs:
+            rv['kwargs'] = {k: encode(it) for k, it in v.kwargs.items()}
+        if v.name:
+            rv['name'] = v.name
+        if v.reverse:
+            rv['reverse'] = True
+        if v.connect:
+            rv['connect'] = True
+        return rv
+    elif isinstance(v, Vector):
+        return {'$': 'Vector', 'v': _vec(v)}
+    elif isinstance(v, (PPos, Pos)):
+        if isinstance(v, PPos):
+            rv = {'$': 'PPos', 'v': list(v._initial)}
+        else:
+            rv = {'$': 'Pos', 'v': _vec(v.position)}
+        zdir = getattr(v, 'default_zdir', None)
+        if zdir is not None:
+            rv['z'] = encode(zdir)
+        return rv
+    elif isinstance(v, Location):
+        # OCC orthogonalizes the matrix on restore, restored
+        # locations keep their values to have a stable hash
+        values = getattr(v, '_ir', None) or location_matrix(v).ravel().tolist()
+        return {'$': 'Location', 'v': values}
+    elif isinstance(v, Axis):
+        return {'$': 'Axis', 'v': [_vec(v.position), _vec(v.direction)]}
+    elif isinstance(v, Plane):
+        return {'$': 'Plane', 'v': [_vec(v.origin), _vec(v.x_dir), _vec(v.z_dir)]}
+    elif isinstance(v, by_tangent):
+        return {'$': 'by_tangent', 'v': [encode(v.obj), encode(v.sort_by), v.idx]}
+    raise TypeError(f'{type(v).__name__} can not be serialized')
+
+
+def _decode_pos(d, cls, value):
+    rv = cls(*value)
+    if 'z' in d:
+        rv.default_zdir = decode(d['z'])
+    return rv
+
+
+def _decode_location(values):
+    t = gp_Trsf()
+    t.SetValues(*values)
+    rv = Location(TopLoc_Location(t))
+    rv._ir = values
+    return rv
+
+
+_DECODERS = {
+    'list': lambda d: [decode(it) for it in d['v']],
+    'dict': lambda d: {k: decode(it) for k, it in d['v'].items()},
+    'Vector': lambda d: Vector(*d['v']),
+    'Pos': lambda d: _decode_pos(d, Pos, d['v']),
+    'PPos': lambda d: _decode_pos(d, PPos, d['v']),
+    'Location': lambda d: _decode_location(d['v']),
+    'Axis': lambda d: Axis(*d['v']),
+    'Plane': lambda d: Plane(d['v'][0], x_dir=d['v'][1], z_dir=d['v'][2]),
+    'by_tangent': lambda d: by_tangent(decode(d['v'][0]), decode(d['v'][1]), d['v'][2]),
+}
+
+
+def decode(v):
+    if isinstance(v, list):
+        return tuple(decode(it) for it in v)
+    elif not isinstance(v, dict):
+        return v
+
+    tag = v['$']
+    if tag == 'op':
+        try:
+            fn = op_registry[v['fn']]
+        except KeyError:
+            raise ValueError(f'Unknown op {v["fn"]}') from None
+        return op_data_holder(
+            fn, v.get('name'), v.get('reverse', False), v.get('connect', False),
+            tuple(decode(it) for it in v.get('args', ())),
+            {k: decode(it) for k, it in v.get('kwargs', {}).items()})
+    return _DECODERS[tag](v)
+
+
+def to_ir(ops):
+    return {'version': IR_VERSION, 'ops': [encode(it) for it in ops]}
+
+
+def from_ir(doc):
+    if doc.get('version') != IR_VERSION:
+        raise ValueError(f'Unsupported IR version {doc.get("version")}')
+    return [decode(it) for it in doc['ops']]
+
+
+def dumps(ops):
+    return json.dumps(to_ir(ops), sort_keys=True, separators=(',', ':'))
+
+
+def loads(s):
+    return from_ir(json.loads(s))
+
+
+def ops_hash(ops):
+    return hashlib.sha256(dumps(ops).encode()).hexdigest()
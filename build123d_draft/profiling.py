@@ -0,0 +1,131 @@
+"""Per-op profiling of build_line
+
+Records every op applied by any build_line in the process while
+active::
+
+    with profile() as prof:
+        build_model()
+    print(prof.format())
+    prof.report()['types']['op_fillet']['time']
+
+Point runs are applied one op at a time while profiling and ops
+restored from an OpCache are not recorded. ``shapes`` of a record is
+the number of OCC edges the op stored in its line, edges of fused wires
+included, analytic curves are not counted.
+"""
+import time
+import threading
+from contextlib import contextmanager
+from collections import namedtuple
+
+from build123d.geometry import Pos, Vector
+from build123d.topology import Shape, Wire
+
+from .utils import PPos
+from .build_line import op_data_holder, _set_profiler
+from . import analytic as _an
+
+
+OpRecord = namedtuple('OpRecord', 'op type time shapes error')
+
+
+def _kernel_edges(shape):
+    if isinstance(shape, _an.Curve):
+        return 0
+    elif isinstance(shape, Wire):
+        return shape.wrapped.NbChildren()
+    return 1
+
+
+def _op_type(op):
+    if isinstance(op, op_data_holder):
+        return op.fn.__name__
+    elif isinstance(op, Shape):
+        return 'shape'
+    return type(op).__name__
+
+
+def _op_label(op):
+    if isinstance(op, PPos):
+        return f'PPos{op._initial}'
+    elif isinstance(op, Pos):
+        return f'Pos{op.position.to_tuple()}'
+    elif isinstance(op, Vector):
+        return f'Vector{op.to_tuple()}'
+    elif isinstance(op, Shape):
+        return type(op).__name__
+    return repr(op)
+
+
+class Profiler:
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+        # edges stored per thread, counted by build_line while profiling
+        self._counter = threading.local()
+
+    def _stored(self):
+        return getattr(self._counter, 'n', 0)
+
+    def stored(self, shapes):
+        self._counter.n = self._stored() + sum(map(_kernel_edges, shapes))
+
+    def record(self, lb, op, apply):
+        created, error = self._stored(), None
+        start = time.perf_counter()
+        try:
+            return apply(op)
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            rec = OpRecord(_op_label(op), _op_type(op), time.perf_counter() - start,
+                           self._stored() - created, error)
+            with self._lock:
+                self.records.append(rec)
+
+    def clear(self):
+        with self._lock:
+            self.records = []
+
+    def report(self):
+        """Per-op records and totals per op type and overall"""
+        with self._lock:
+            records = list(self.records)
+
+        types = {}
+        for it in records:
+            t = types.setdefault(it.type, {'count': 0, 'time': 0.0, 'shapes': 0, 'errors': 0})
+            t['count'] += 1
+            t['time'] += it.time
+            t['shapes'] += it.shapes
+            t['errors'] += it.error is not None
+        total = {k: sum(it[k] for it in types.values())
+                 for k in ('count', 'time', 'shapes', 'errors')}
+        return {'ops': [it._asdict() for it in records], 'types': types, 'total': total}
+
+    def format(self, top=20):
+        """Text table of op types and the slowest ops"""
+        rv = self.report()
+        lines = [f'{"type":<24} {"count":>7} {"time, ms":>10} {"shapes":>7} {"errors":>6}']
+        types = sorted(rv['types'].items(), key=lambda it: -it[1]['time'])
+        for name, t in types + [('total', rv['total'])]:
+            lines.append(f'{name:<24} {t["count"]:>7} {t["time"]*1000:>10.2f} '
+                         f'{t["shapes"]:>7} {t["errors"]:>6}')
+        lines.append('')
+        lines.append(f'{"time, ms":>10} {"shapes":>6}  op')
+        for it in sorted(rv['ops'], key=lambda it: -it['time'])[:top]:
+            error = f'  ! {it["error"]}' if it['error'] else ''
+            lines.append(f'{it["time"]*1000:>10.2f} {it["shapes"]:>6}  {it["op"]}{error}')
+        return '\n'.join(lines)
+
+
+@contextmanager
+def profile(profiler=None):
+    """Record ops of all build_lines in the process, nested calls shadow outer ones"""
+    profiler = Profiler() if profiler is None else profiler
+    prev = _set_profiler(profiler)
+    try:
+        yield profiler
+    finally:
+        _set_profiler(prev)
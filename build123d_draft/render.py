@@ -1,12 +1,18 @@
 import io
+import struct
+import weakref
+import hashlib
 import functools
+import collections
 import math
 
 import OCP
 import numpy as np
 from PIL import Image
 
-from build123d import Face, Color
+from build123d import Color
+
+from .utils import _brep_bytes
 
 dpr = math.pi/180
 
@@ -30,29 +36,234 @@ PROJECTIONS = {
 
 
 @functools.lru_cache(1)
-def render_context(size, bg):
+def graphic_driver():
+    """Display connection and OpenGL driver shared by all render contexts"""
     disp = OCP.Aspect.Aspect_DisplayConnection()
     gl = OCP.OpenGl.OpenGl_GraphicDriver(disp, True)
     gl.ChangeOptions().swapInterval = 0
-    viewer = OCP.V3d.V3d_Viewer(gl)
-    ctx = OCP.AIS.AIS_InteractiveContext(viewer)
-    viewer.SetDefaultLights()
-    viewer.SetLightOn()
+    return disp, gl
+
+
+class RenderContext:
+    """Viewer with an offscreen view of a fixed size"""
+    def __init__(self, size, bg=None):
+        disp, gl = graphic_driver()
+        self.viewer = OCP.V3d.V3d_Viewer(gl)
+        self.ctx = OCP.AIS.AIS_InteractiveContext(self.viewer)
+        self.viewer.SetDefaultLights()
+        self.viewer.SetLightOn()
+
+        self.window = OCP.Xw.Xw_Window(disp, "some", 64, 64, *size)
+        self.window.SetVirtual(True)
+        self.view = OCP.V3d.V3d_View(self.viewer)
+        self.view.SetWindow(self.window)
+        # self.view.SetShadingModel(OCP.Graphic3d.Graphic3d_TypeOfShadingModel_Pbr)
+
+        self.size = size
+        self.bg = None
+        self.set_background(bg)
+        self.leases = 0
+
+    def set_background(self, bg):
+        if bg != self.bg:
+            self.view.SetBackgroundColor(ocp_color(bg or (0, 0, 0)))
+        self.bg = bg
+
+    def release(self):
+        self.ctx.RemoveAll(False)
+        self.view.Remove()
+
+
+class RenderPool:
+    """LRU pool of render contexts keyed on (size, bg)
+
+    get() leases a context and put() returns it. Only contexts without
+    leases are evicted or reused with a new background of the same size
+    when the pool is full, leased ones may take the pool over maxsize.
+    """
+    def __init__(self, maxsize=4):
+        self.maxsize = maxsize
+        self._data = collections.OrderedDict()
+
+    def get(self, size, bg=None):
+        key = size, bg
+        rv = self._data.get(key)
+        if rv is not None:
+            self._data.move_to_end(key)
+        else:
+            if len(self._data) >= self.maxsize:
+                old = next((k for k, v in self._data.items() if k[0] == size and not v.leases), None)
+                if old is not None:
+                    rv = self._data.pop(old)
+                    rv.set_background(bg)
+            if rv is None:
+                rv = RenderContext(size, bg)
+            self._data[key] = rv
+        rv.leases += 1
+        self._evict()
+        return rv
+
+    def put(self, context):
+        context.leases -= 1
+        self._evict()
+
+    def _evict(self):
+        while len(self._data) > self.maxsize:
+            key = next((k for k, v in self._data.items() if not v.leases), None)
+            if key is None:
+                break
+            self._data.pop(key).release()
+
+    def release(self, size=None, bg=None):
+        """Release an unleased context or all of them"""
+        keys = list(self._data) if size is None else [(size, bg)]
+        for k in keys:
+            ctx = self._data.get(k)
+            if ctx is not None and not ctx.leases:
+                del self._data[k]
+                ctx.release()
+
+    def __len__(self):
+        return len(self._data)
+
+
+render_pool = RenderPool()
+
+
+def render_context(size, bg):
+    """(view, ctx) of a pooled context, the lease is held for the process lifetime"""
+    context = render_pool.get(size, bg)
+    return context.view, context.ctx
+
+
+class TessellationCache:
+    """LRU cache of meshed shapes keyed on geometry and deflection
+
+    A shape is meshed with the drawer's deflection once, later shapes
+    with the same BRep (up to location) are displayed as the cached
+    meshed copy. The same shape object is looked up without hashing its
+    BRep. Memory is the estimated size of triangulations.
+    """
+    def __init__(self, max_bytes=256 * 2**20):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._identity = {}
+
+    def get(self, wrapped, drawer):
+        """Meshed shape with the same geometry and location as wrapped"""
+        if not OCP.TopExp.TopExp_Explorer(wrapped, OCP.TopAbs.TopAbs_FACE).More():
+            return wrapped
+
+        loc = wrapped.Location()
+        base = wrapped.Located(OCP.TopLoc.TopLoc_Location())
+        # relative deflection is stored into the drawer, keep the shared one intact
+        link, drawer = drawer, OCP.Prs3d.Prs3d_Drawer()
+        drawer.Link(link)
+        deflection = (OCP.StdPrs.StdPrs_ToolTriangulatedShape.GetDeflection_s(base, drawer),
+                      drawer.DeviationAngle())
+
+        # refs keep looked up shapes alive, so their hashes aren't reused
+        ident = hash(base), deflection
+        key = self._identity.get(ident)
+        entry = self._data.get(key) if key else None
+        ref = entry and entry[2].get(ident)
+        if ref is None or not ref.IsSame(base):
+            key = hashlib.sha256(_brep_bytes(base)).digest(), deflection
+            entry = self._data.get(key)
+
+        if entry is not None:
+            self.hits += 1
+            self._data.move_to_end(key)
+        else:
+            self.misses += 1
+            OCP.StdPrs.StdPrs_ToolTriangulatedShape.Tessellate_s(base, drawer)
+            entry = [base, mesh_size(base), {}]
+            self._data[key] = entry
+            self.size += entry[1]
+            self._evict()
+
+        entry[2][ident] = base
+        self._identity[ident] = key
+        return entry[0].Located(loc)
+
+    def _evict(self):
+        while self.size > self.max_bytes and len(self._data) > 1:
+            key, (_, size, refs) = self._data.popitem(last=False)
+            self.size -= size
+            for it in refs:
+                if self._identity.get(it) == key:
+                    del self._identity[it]
+
+    def clear(self):
+        self._data.clear()
+        self._identity.clear()
+        self.size = 0
+
+
+def mesh_size(wrapped):
+    """Estimated memory of face triangulations in bytes"""
+    rv = 0
+    loc = OCP.TopLoc.TopLoc_Location()
+    exp = OCP.TopExp.TopExp_Explorer(wrapped, OCP.TopAbs.TopAbs_FACE)
+    while exp.More():
+        tri = OCP.BRep.BRep_Tool.Triangulation_s(OCP.TopoDS.TopoDS.Face_s(exp.Current()), loc)
+        if tri is not None:
+            node = 24 + 12 * tri.HasNormals() + 16 * tri.HasUVNodes()
+            rv += tri.NbNodes() * node + tri.NbTriangles() * 12
+        exp.Next()
+    return rv
+
+
+tessellation_cache = TessellationCache()
+
+
+@functools.lru_cache(16)
+def hatch_texture(hscale):
+    """Capping hatch texture, shared so the image is loaded once per scale"""
+    tx = OCP.Graphic3d.Graphic3d_Texture2D(OCP.TCollection.TCollection_AsciiString('resources/hatch_2.png'))
+    tx.GetParams().SetScale(OCP.gp.gp_Vec2f(hscale, hscale))
+    tx.EnableModulate()
+    tx.EnableRepeat()
+    return tx
 
-    window = OCP.Xw.Xw_Window(disp, "some", 64, 64, *size)
-    window.SetVirtual(True)
-    view = OCP.V3d.V3d_View(viewer)
-    view.SetWindow(window)
-    # view.SetShadingModel(OCP.Graphic3d.Graphic3d_TypeOfShadingModel_Pbr)
 
-    if bg:
-        view.SetBackgroundColor(ocp_color(bg))
+def plane_key(plane):
+    return tuple(it.to_tuple() for it in (plane.origin, plane.x_dir, plane.z_dir))
 
-    return view, ctx
+
+_sections = collections.OrderedDict()
+
+
+def section(wrapped, plane, maxsize=32):
+    """Edges of a shape section by a plane, LRU cached per (shape, plane)"""
+    key = hash(wrapped), plane_key(plane)
+    entry = _sections.get(key)
+    if entry is not None and entry[0].IsSame(wrapped):
+        _sections.move_to_end(key)
+        return entry[1]
+
+    op = OCP.BRepAlgoAPI.BRepAlgoAPI_Section(wrapped, plane.wrapped, False)
+    op.Build()
+    if not op.IsDone():
+        raise RuntimeError('Failed to section a shape')
+    rv = op.Shape()
+    _sections[key] = wrapped, rv
+    _sections.move_to_end(key)
+    while len(_sections) > maxsize:
+        _sections.popitem(last=False)
+    return rv
+
+
+VIEW_PARAMS = ('start', 'rotz', 'roty', 'zoom', 'fit', 'proj')
 
 
 class ImageExporter:
     default_color = ocp_color(0.9, 0.8, 0.23)
+    # None meshes every shown shape anew
+    tessellation_cache = tessellation_cache
 
     def __init__(self, size=(720, 480), bg=None, transparent=True, render_scale=2.0):
         self.size = size
@@ -60,11 +271,17 @@ class ImageExporter:
         self.render_scale = render_scale
         self.bg = bg
         self.transparent = transparent
-        self.view, self.ctx = render_context(self.rsize, bg)
+        context = render_pool.get(self.rsize, bg)
+        self.view, self.ctx = context.view, context.ctx
+        self._lease = weakref.finalize(self, render_pool.put, context)
 
         self.clear()
         self.configure()
 
+    def release(self):
+        """Return the render context to the pool, also done on garbage collection"""
+        self._lease()
+
     def clear(self, reset_view=True):
         self.ctx.RemoveAll(False)
         if reset_view:
@@ -78,11 +295,13 @@ class ImageExporter:
         drawer.SetFaceBoundaryDraw(True)
         drawer.ShadingAspect().SetColor(ocp_color(self.default_color))
 
-    def show(self, shape, clip=None, hatch=True, hscale=0.05, alpha=None,
-             edges=None, line_width=None, clip_outline=True, color=None):
+    def presentation(self, shape, alpha=None, edges=None, line_width=None, color=None):
         shape_color = color or getattr(shape, 'color', None)
 
-        prs = OCP.AIS.AIS_Shape(shape.wrapped)
+        wrapped = shape.wrapped
+        if self.tessellation_cache is not None:
+            wrapped = self.tessellation_cache.get(wrapped, self.ctx.DefaultDrawer())
+        prs = OCP.AIS.AIS_Shape(wrapped)
         if alpha is not None:
             prs_drw = prs.Attributes()
             prs_drw.SetupOwnShadingAspect()
@@ -103,31 +322,90 @@ class ImageExporter:
         if edges is not None:
             prs.Attributes().SetFaceBoundaryDraw(edges)
 
+        return prs
+
+    def clip_outline(self, shape, clip):
+        prs_outline = OCP.AIS.AIS_Shape(section(shape.wrapped, clip))
+        prs_outline.SetColor(ocp_color(0.9, 0.1, 0.1))
+        prs_outline.SetWidth(3)
+        return [prs_outline]
+
+    def clip_plane(self, clip, hatch=True, hscale=0.05, color=None):
+        cp = OCP.Graphic3d.Graphic3d_ClipPlane(clip.wrapped)
+        if hatch:
+            cp.SetCappingTexture(hatch_texture(hscale))
+
+        cp.SetCapping(True)
+        cp.SetCappingColor(ocp_color(color or self.default_color))
+        cp.SetUseObjectMaterial(True)
+        return cp
+
+    def show(self, shape, clip=None, hatch=True, hscale=0.05, alpha=None,
+             edges=None, line_width=None, clip_outline=True, color=None):
+        prs = self.presentation(shape, alpha, edges, line_width, color)
         if clip:
             if clip_outline:
-                outline = shape & Face.make_plane(clip)
-
-                for w in outline.wires():
-                    prs_outline = OCP.AIS.AIS_Shape(w.wrapped)
-                    prs_outline.SetColor(ocp_color(0.9, 0.1, 0.1))
-                    prs_outline.SetWidth(3)
-                    self.ctx.Display(prs_outline, OCP.AIS.AIS_Shaded, -1, False)
-
-            cp = OCP.Graphic3d.Graphic3d_ClipPlane(clip.wrapped)
-            if hatch:
-                tx = OCP.Graphic3d.Graphic3d_Texture2D(OCP.TCollection.TCollection_AsciiString('resources/hatch_2.png'))
-                tx.GetParams().SetScale(OCP.gp.gp_Vec2f(hscale, hscale))
-                tx.EnableModulate()
-                tx.EnableRepeat()
-                cp.SetCappingTexture(tx)
-
-            cp.SetCapping(True)
-            cp.SetCappingColor(ocp_color(shape_color or self.default_color))
-            cp.SetUseObjectMaterial(True)
-            prs.AddClipPlane(cp)
+                for it in self.clip_outline(shape, clip):
+                    self.ctx.Display(it, OCP.AIS.AIS_Shaded, -1, False)
+            prs.AddClipPlane(self.clip_plane(clip, hatch, hscale, color or getattr(shape, 'color', None)))
 
         self.ctx.Display(prs, OCP.AIS.AIS_Shaded, -1, False)
 
+    def render_views(self, shape, views, tile=False, hatch=True, hscale=0.05,
+                     clip_outline=True, **kwargs):
+        """Images of a shape from several views, displayed once
+
+        A view is a dict or an object with any of setup_view arguments
+        and ``clip`` and ``hscale`` of show(). Clip planes and outlines
+        are made once per distinct clip, presentations are only
+        redrawn. With tile returns a horizontal composite of the images.
+        """
+        self.clear()
+        prs = self.presentation(shape, **kwargs)
+        color = kwargs.get('color') or getattr(shape, 'color', None)
+        self.ctx.Display(prs, OCP.AIS.AIS_Shaded, -1, False)
+
+        images = []
+        planes = {}
+        outlines = {}
+        shown = []
+        active = None
+        for v in views:
+            p = v if isinstance(v, dict) else vars(v)
+            clip = p.get('clip')
+            for it in shown:
+                self.ctx.Erase(it, False)
+            shown = []
+            if active is not None:
+                prs.RemoveClipPlane(active)
+                active = None
+            if clip:
+                key = plane_key(clip)
+                if clip_outline:
+                    if key not in outlines:
+                        outlines[key] = self.clip_outline(shape, clip)
+                    shown = outlines[key]
+                    for it in shown:
+                        self.ctx.Display(it, OCP.AIS.AIS_Shaded, -1, False)
+                phscale = p.get('hscale', hscale)
+                if (key, phscale) not in planes:
+                    planes[key, phscale] = self.clip_plane(clip, hatch, phscale, color)
+                active = planes[key, phscale]
+                prs.AddClipPlane(active)
+
+            self.view.Reset(False)
+            self.setup_view(**{k: p[k] for k in VIEW_PARAMS if k in p})
+            images.append(self.export())
+
+        if not tile:
+            return images
+        out = Image.new('RGBA', (sum(it.size[0] for it in images), max(it.size[1] for it in images)))
+        x = 0
+        for it in images:
+            out.paste(it, (x, 0))
+            x += it.size[0]
+        return out
+
     def setup_view(self, start=None, rotz=None, roty=None, zoom=None, fit=0.01, proj=None):
         if not start:
             start = (0, 0, 0)
@@ -147,21 +425,64 @@ class ImageExporter:
         else:
             self.view.FitAll(fit, False)
 
-    def export(self):
+    def export_array(self):
+        """Rendered frame as an (h, w, 4) RGBA uint8 array of ``size``"""
         image = OCP.Image.Image_AlienPixMap()
         self.view.ToPixMap(image, *self.rsize)
+        # BMP is the pixmap buffer as is, rows padded to 4 bytes, no encoding
         buf = io.BytesIO()
-        image.Save(buf, OCP.TCollection.TCollection_AsciiString('.png'))
+        image.Save(buf, OCP.TCollection.TCollection_AsciiString('.bmp'))
+        bgra = bmp_array(buf.getbuffer())
 
-        out = Image.open(buf)
+        d = np.empty(bgra.shape[:2] + (4,), np.uint8)
+        d[..., :3] = bgra[..., 2::-1]
+        if bgra.shape[2] == 4:
+            d[..., 3] = bgra[..., 3]
+        else:
+            d[..., 3] = 255
 
         if self.transparent:
-            out = out.convert('RGBA')
-            d = np.array(out)
-            key_color = tuple(int(it*255) for it in self.bg) + (255,)
-            d[(d == key_color).all(axis=-1)] = [0, 0, 0, 0]
-            out = Image.fromarray(d, mode='RGBA')
+            key_color = np.array([int(it*255) for it in self.bg or (0, 0, 0)], np.uint8)
+            d[(d[..., :3] == key_color).all(axis=-1)] = 0
 
         if self.size != self.rsize:
-            return out.resize(self.size)
-        return out
+            return downsample(d, self.size)
+        return d
+
+    def export(self):
+        return Image.fromarray(self.export_array(), mode='RGBA')
+
+
+def bmp_array(data):
+    """(h, w, c) BGR(A) top-down view of an uncompressed 24 or 32 bit BMP"""
+    offset, = struct.unpack_from('<I', data, 10)
+    w, h, _, bpp = struct.unpack_from('<iiHH', data, 18)
+    c = bpp // 8
+    stride = (w * c + 3) & ~3
+    rv = np.ndarray((abs(h), w, c), np.uint8, data, offset, (stride, c, 1))
+    # positive height means bottom-up rows
+    return rv[::-1] if h > 0 else rv
+
+
+def downsample(d, size):
+    """Resize an RGBA array to size, box filter for integer factors
+
+    Colors of a block are averaged over its opaque pixels, so keyed out
+    background doesn't darken edges.
+    """
+    h, w = d.shape[:2]
+    sx, rx = divmod(w, size[0])
+    sy, ry = divmod(h, size[1])
+    if rx or ry or not sx or not sy:
+        return np.asarray(Image.fromarray(d, mode='RGBA').resize(size, Image.BOX))
+
+    acc = d[::sy, ::sx].astype(np.uint32)
+    for i in range(sy):
+        for j in range(sx):
+            if i or j:
+                acc += d[i::sy, j::sx]
+    alpha = acc[..., 3:]
+    rv = np.empty(acc.shape, np.uint8)
+    rv[..., :3] = acc[..., :3] * 255 // np.maximum(alpha, 1)
+    rv[..., 3:] = alpha // (sx * sy)
+    return rv
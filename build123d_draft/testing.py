@@ -28,6 +28,8 @@ class ShowList:
         @functools.wraps(fn)
         def inner(*args, **kwargs):
             self.append(part=fn(*args, **kwargs))
+        # model builder without the show list, for corpus runners
+        inner.model = fn
         return inner
 
     def origin_radius(self):
@@ -1,4 +1,6 @@
 import functools
+
+import numpy as np
 from build123d.geometry import Vector, Pos, Location, Plane, Axis, RotationLike
 from build123d.topology import Wire, Edge, ShapeList, tuplify, new_edges, Part
 from build123d.operations_generic import mirror, split
@@ -10,7 +12,7 @@ from build123d.objects_curve import Line
 from build123d.build_enums import Align, Mode
 
 from . import O
-from .utils import _defined
+from .utils import _defined, _shape_getstate, _shape_setstate
 
 
 def fillet_tool(r, length, align):
@@ -48,21 +50,82 @@ def overshoot_line(p1, p2, start=0, end=0):
     return Line(p1 - d * start, p2 + d * end)
 
 
+class _EdgeIndex:
+    """Edge bounding boxes of a shape to prefilter intersection queries"""
+    def __init__(self, shape):
+        self.edges = shape.edges()
+        boxes = [it.bounding_box(optimal=False) for it in self.edges]
+        self.lo = np.array([it.min.to_tuple() for it in boxes]).reshape(-1, 3)
+        self.hi = np.array([it.max.to_tuple() for it in boxes]).reshape(-1, 3)
+
+    def candidates(self, other, tolerance=0):
+        pad = tolerance + 1e-7
+        lo, hi = self.lo - pad, self.hi + pad
+        if isinstance(other, Axis):
+            # slab test against an infinite line
+            p = np.array(other.position.to_tuple())
+            d = np.array(other.direction.to_tuple())
+            parallel = np.abs(d) < 1e-12
+            sd = np.where(parallel, 1, d)
+            t1, t2 = (lo - p) / sd, (hi - p) / sd
+            tmin = np.where(parallel, -np.inf, np.minimum(t1, t2)).max(1)
+            tmax = np.where(parallel, np.inf, np.maximum(t1, t2)).min(1)
+            inside = ((lo <= p) & (p <= hi)) | ~parallel
+            mask = (tmin <= tmax) & inside.all(1)
+        elif isinstance(other, Plane):
+            # box projections on the normal should straddle the plane
+            n = np.array(other.z_dir.to_tuple())
+            c = (lo + hi) / 2 @ n - np.dot(other.origin.to_tuple(), n)
+            mask = np.abs(c) <= (hi - lo) / 2 @ np.abs(n)
+        elif hasattr(other, 'bounding_box'):
+            bb = other.bounding_box(optimal=False)
+            mask = ((lo <= bb.max.to_tuple()) & (hi >= bb.min.to_tuple())).all(1)
+        else:
+            return np.arange(len(self.edges))
+        return np.flatnonzero(mask)
+
+    def distances(self, idx, point):
+        """Lower bound of distances from point to edges"""
+        p = np.array(point.to_tuple())
+        gap = np.maximum(np.maximum(self.lo[idx] - p, p - self.hi[idx]), 0)
+        return np.linalg.norm(gap, axis=1)
+
+
+@functools.lru_cache(maxsize=256)
+def _edge_index(shape):
+    return _EdgeIndex(shape)
+
+
 def intersections(shape, other, tolerance=0):
+    index = _edge_index(shape)
     r = []
-    for e in shape.edges():
-        # print('### X', e.center(), other)
-        r.extend(e.find_intersection_points(other, tolerance=tolerance))
+    for i in index.candidates(other, tolerance):
+        r.extend(index.edges[i].find_intersection_points(other, tolerance=tolerance))
     return ShapeList(r)
 
 
-def intersection(shape, other, near_by=None, tolerance=0):
+def intersection(shape, other, near_by=None, tolerance=0, sort_by=None, idx=0):
     # TODO: near_by could be declarative like 'end', 'start', 'center'
     # or a param coordinate to specify point on shape instead of fixing
     # it to the end as now
-    r = intersections(shape, other, tolerance=tolerance)
-    points = r.sort_by_distance(near_by or shape.e)
-    return points[0]
+    if sort_by is not None:
+        return intersections(shape, other, tolerance=tolerance).sort_by(sort_by)[idx]
+
+    # nearest first: edges are visited by distance to their boxes
+    ref = Vector(near_by or shape.e)
+    index = _edge_index(shape)
+    cidx = index.candidates(other, tolerance)
+    lower = index.distances(cidx, ref)
+    rv, dist = None, np.inf
+    for i in np.argsort(lower, kind='stable'):
+        if lower[i] > dist:
+            break
+        for p in index.edges[cidx[i]].find_intersection_points(other, tolerance=tolerance):
+            if (p - ref).length < dist:
+                rv, dist = p, (p - ref).length
+    if rv is None:
+        raise IndexError('No intersection points found')
+    return rv
 
 
 def cbore(r1, depth1, r2, total_depth):
@@ -118,6 +181,9 @@ class Cylinder(Cylinder_orig):
             radius = r
         super().__init__(radius, height, arc_size, rotation, align, mode)
 
+    __getstate__ = _shape_getstate
+    __setstate__ = _shape_setstate
+
     def new(self, radius=None, height=None, d=None, r=None):
         if d is not None:
             if radius is not None:
@@ -144,6 +210,9 @@ class Circle(Circle_orig):
             radius = d/2
         super().__init__(radius, align, mode)
 
+    __getstate__ = _shape_getstate
+    __setstate__ = _shape_setstate
+
     def cylinder(self, height, d=None, r=None, align=Align.MIN):
         radius = self.radius
         if d is not None:
@@ -1,11 +1,71 @@
+import io
 import sys
+import functools
+from bisect import bisect_left, bisect_right
+
+import numpy as np
 import OCP
 from OCP.BRep import BRep_Tool
+from OCP.BinTools import BinTools, BinTools_FormatVersion
+from OCP.TopAbs import TopAbs_ShapeEnum
+from OCP.TopoDS import TopoDS_Shape
 from build123d.geometry import Vector, Pos
-from build123d.topology import isclose_b, Wire, Edge
+from build123d.topology import (isclose_b, downcast, Vertex, Edge, Wire, Face, Shell,
+                                Solid, Compound, Curve, Sketch, Part)
 from build123d.build_common import Builder
 
 
+_SHAPE_TYPES = {
+    TopAbs_ShapeEnum.TopAbs_VERTEX: Vertex,
+    TopAbs_ShapeEnum.TopAbs_EDGE: Edge,
+    TopAbs_ShapeEnum.TopAbs_WIRE: Wire,
+    TopAbs_ShapeEnum.TopAbs_FACE: Face,
+    TopAbs_ShapeEnum.TopAbs_SHELL: Shell,
+    TopAbs_ShapeEnum.TopAbs_SOLID: Solid,
+    TopAbs_ShapeEnum.TopAbs_COMPOUND: Compound,
+}
+
+
+_COMPOSITE_TYPES = {it.__name__: it for it in (Curve, Sketch, Part)}
+
+
+def _brep_bytes(wrapped):
+    buf = io.BytesIO()
+    BinTools.Write_s(wrapped, buf, False, False, BinTools_FormatVersion.BinTools_FormatVersion_CURRENT)
+    return buf.getvalue()
+
+
+def _brep_shape(data):
+    rv = TopoDS_Shape()
+    BinTools.Read_s(rv, io.BytesIO(data))
+    return downcast(rv)
+
+
+def shape_to_bytes(shape):
+    """Binary BRep of a shape (without triangulation) prefixed with a composite type tag"""
+    tag = next((it.__name__ for it in type(shape).__mro__ if it in _COMPOSITE_TYPES.values()), '')
+    return tag.encode() + b'\0' + _brep_bytes(shape.wrapped)
+
+
+def shape_from_bytes(data):
+    tag, _, data = data.partition(b'\0')
+    rv = _brep_shape(data)
+    cls = _COMPOSITE_TYPES.get(tag.decode()) or _SHAPE_TYPES[rv.ShapeType()]
+    return cls(rv)
+
+
+def _shape_getstate(shape):
+    # pickle support for Shape subclasses, BRep goes without triangulation
+    state = shape.__dict__.copy()
+    state['wrapped'] = _brep_bytes(shape.wrapped)
+    return state
+
+
+def _shape_setstate(shape, state):
+    shape.__dict__.update(state)
+    shape.wrapped = _brep_shape(state['wrapped'])
+
+
 def reversed_wire(wire):
     elist = []
     for e in wire.edges():
@@ -19,54 +79,82 @@ def edge_curve(edge):
     return c, (p1, p2)
 
 
+class _WireParams:
+    """Edge curves, ranges and cumulative parameters of a wire in traversal order"""
+    def __init__(self, wire):
+        self.is_reversed = wire.wrapped.Orientation() == OCP.TopAbs.TopAbs_Orientation.TopAbs_REVERSED
+        self.edges = wire.edges()
+        if self.is_reversed:
+            self.edges.reverse()
+        self.curves = [edge_curve(it) for it in self.edges]
+        self.cum = [0]
+        for _, pr in self.curves:
+            self.cum.append(self.cum[-1] + abs(pr[0] - pr[1]))
+        self._boxes = None
+
+    def box_distances(self, point):
+        if self._boxes is None:
+            boxes = [it.bounding_box(optimal=False) for it in self.edges]
+            self._boxes = (np.array([it.min.to_tuple() for it in boxes]),
+                           np.array([it.max.to_tuple() for it in boxes]))
+        lo, hi = self._boxes
+        p = np.array(point.to_tuple())
+        return np.linalg.norm(np.maximum(np.maximum(lo - p, p - hi), 0), axis=1)
+
+
+@functools.lru_cache(maxsize=256)
+def _wire_params(wire, orientation):
+    return _WireParams(wire)
+
+
+def wire_params(wire):
+    return _wire_params(wire, wire.wrapped.Orientation())
+
+
 def param_on_point(wire, point, normalized=True):
-    is_reversed = wire.wrapped.Orientation() == OCP.TopAbs.TopAbs_Orientation.TopAbs_REVERSED
-    edges = wire.edges()
-    si = 0
-    if is_reversed:
-        edges = reversed(edges)
-        si = 1
-
-    U = 0
-    candidates = []
-    pt = Vector(point).to_pnt()
-    for e in edges:
-        c, pr = edge_curve(e)
+    wp = wire_params(wire)
+    si = 1 if wp.is_reversed else 0
+
+    point = Vector(point)
+    pt = point.to_pnt()
+    lower = wp.box_distances(point)
+    best = None
+    # nearest boxes first, stop when a box is further than the best projection
+    for i in np.argsort(lower, kind='stable'):
+        if best is not None and lower[i] > best[0]:
+            break
+        c, pr = wp.curves[i]
         poc = OCP.GeomAPI.GeomAPI_ProjectPointOnCurve(pt, c)
         p = poc.LowerDistanceParameter()
         if pr[0] <= p <= pr[1]:
-            candidates.append((poc.LowerDistance(), U + abs(pr[si] - p)))
-        U += abs(pr[0] - pr[1])
+            candidate = (poc.LowerDistance(), wp.cum[i] + abs(pr[si] - p))
+            if best is None or candidate < best:
+                best = candidate
 
-    if not candidates:
+    if best is None:
         return None
 
-    candidates.sort()
-    u = candidates[0][1]
+    u = best[1]
     if normalized:
-        return u / U
+        return u / wp.cum[-1]
     return u
 
 
 def trim_wire(wire, start=0, end=1):
-    is_reversed = wire.wrapped.Orientation() == OCP.TopAbs.TopAbs_Orientation.TopAbs_REVERSED
+    wp = wire_params(wire)
+    is_reversed = wp.is_reversed
 
-    edges = wire.edges()
-    if is_reversed:
-        edges.reverse()
-
-    curves = [(it, edge_curve(it)) for it in edges]
-    U = sum(abs(pr[0] - pr[1]) for _, (_, pr) in curves)
-    start *= U
-    end *= U
+    cum = wp.cum
+    start *= cum[-1]
+    end *= cum[-1]
 
     nedges = []
-    u2 = 0
-    for e, (c, pr) in curves:
-        u1 = u2
-        u2 = (u1 + abs(pr[0] - pr[1]))
-        if u2 < start or u1 > end:
-            continue
+    # edges overlapping [start, end]
+    first = bisect_left(cum, start, 1) - 1
+    last = bisect_right(cum, end, 0, len(wp.edges)) - 1
+    for i in range(first, last + 1):
+        e, (c, pr) = wp.edges[i], wp.curves[i]
+        u1, u2 = cum[i], cum[i + 1]
 
         t1, t2 = pr
         if u1 <= start <= u2:
@@ -167,6 +255,69 @@ def assert_args(vals, *cases):
     assert False, f'matched_cases={matched_count}: ' + str(cases)
 
 
+class ArgCases:
+    """assert_args cases compiled into bitmasks
+
+    Each argument gets a bit, a call computes masks of defined (not None),
+    set (not None and not False) and False arguments once and cases are
+    checked against them without parsing the case strings again.
+    """
+    def __init__(self, *cases):
+        self.cases = cases
+        self.bits = {it: 1 << i for i, it in enumerate(sorted(set(_iter_args(cases))))}
+        self.compiled = [self._compile(it if type(it) is list else [it]) for it in cases]
+
+    def _compile(self, case):
+        # required masks of defined, None, set and False args,
+        # (mask, at_most_one) groups for tuples of plain names
+        # and generic predicates for anything else
+        masks = [0, 0, 0, 0]
+        groups = []
+        rest = []
+        for it in case:
+            if type(it) is str:
+                masks['-+!'.find(it[0]) + 1] |= self.bits[it.lstrip('+-!')]
+            elif type(it) is tuple and all(type(n) is str and n[0] not in '-+!' for n in it[1:]) \
+                    and (it[0] is None or type(it[0]) is str and it[0][0] not in '-+!'):
+                groups.append((sum(self.bits[n] for n in it if n is not None), it[0] is None))
+            else:
+                rest.append(self._predicate(it))
+        return (*masks, groups, rest)
+
+    def _predicate(self, case):
+        def check(vals):
+            return _eval_args(vals, case)
+        return check
+
+    def __call__(self, vals):
+        dm = pm = fm = 0
+        for name, bit in self.bits.items():
+            v = vals[name]
+            if v is not None:
+                dm |= bit
+                if v is False:
+                    fm |= bit
+                else:
+                    pm |= bit
+
+        matched_count = 0
+        for d, n, p, f, groups, rest in self.compiled:
+            if dm & d != d or dm & n or pm & p != p or fm & f != f:
+                continue
+            for m, at_most in groups:
+                c = bin(dm & m).count('1')
+                if c > 1 or not (c or at_most):
+                    break
+            else:
+                if all(it(vals) for it in rest):
+                    matched_count += 1
+
+        if matched_count == 1:
+            return
+
+        assert False, f'matched_cases={matched_count}: ' + str(self.cases)
+
+
 class PPos(Pos):
     def __init__(self, X=None, Y=None, Z=None):
         self._initial = (X, Y, Z)
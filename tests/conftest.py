@@ -1,11 +1,17 @@
 import os
+import json
 import pytest
+import hashlib
 import dataclasses
 
-import PIL
+import OCP
 
+from build123d_draft import render as _render
 from build123d_draft.render import ImageExporter
-from build123d import Plane
+from build123d_draft.utils import shape_to_bytes
+from build123d import Plane, Shape
+
+MANIFEST = 'assets/render_manifest.json'
 
 
 @dataclasses.dataclass()
@@ -16,6 +22,34 @@ class view:
     hscale: float = 0.05
 
 
+def _color_key(color):
+    if isinstance(color, OCP.Quantity.Quantity_Color):
+        return [color.Red(), color.Green(), color.Blue()]
+    return color if color is None else list(color)
+
+
+def render_key(shape, views, size, **kwargs):
+    """Hash of shape geometry and presentation, view parameters and renderer code"""
+    h = hashlib.sha256(shape_to_bytes(shape))
+    with open(_render.__file__, 'rb') as f:
+        h.update(f.read())
+    presentation = dict(kwargs, color=kwargs.get('color') or getattr(shape, 'color', None))
+    params = [size, sorted((k, _color_key(v) if k == 'color' else v) for k, v in presentation.items())]
+    for v in views:
+        clip = v.clip and [it.to_tuple() for it in (v.clip.origin, v.clip.x_dir, v.clip.z_dir)]
+        params.append([v.rotz, v.roty, clip, v.hscale])
+    h.update(json.dumps(params).encode())
+    return h.hexdigest()
+
+
+def load_manifest():
+    try:
+        with open(MANIFEST) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
 @pytest.fixture(autouse=True)
 def render(request):
     yield
@@ -25,30 +59,33 @@ def render(request):
 
         m = request.node.get_closest_marker('views')
         size = (m.kwargs if m else {}).get('size', (720, 480))
-        views = m.args if m else [None]
-
-        images = []
-        for v in views:
+        views = []
+        for v in (m.args if m else [None]):
             if v is None:
                 v = view()
             elif isinstance(v, tuple):
                 v = view(*v)
+            views.append(v)
+
+        shape = request.module.slist.objects[-1]
 
+        def draw(**kwargs):
             ie = ImageExporter(size, bg=(1, 0, 1), transparent=True)
-            ie.show(request.module.slist.objects[-1], clip=v.clip, hscale=v.hscale)
-            ie.setup_view(rotz=v.rotz, roty=v.roty)
-
-            img = ie.export()
-            images.append(img)
-
-        if len(images) == 1:
-            images[0].save(fname)
-        else:
-            total_width = sum(it.size[0] for it in images)
-            out = PIL.Image.new('RGBA', (total_width, images[0].size[1]))
-            x = 0
-            for it in images:
-                out.paste(im=it, box=(x, 0))
-                x += it.size[0]
-
-            out.save(fname)
+            return ie.render_views(shape, views, tile=True, **kwargs)
+        render_cached(fname, shape, views, size, draw)
+
+
+def render_cached(fname, shape, views, size, draw, **kwargs):
+    """Save draw(**kwargs) to fname unless the manifest has its render_key, True if drawn"""
+    # skip unchanged models, their png matches the hash in the manifest
+    key = render_key(shape, views, size, **kwargs) if isinstance(shape, Shape) else None
+    manifest = load_manifest()
+    if key is not None and manifest.get(fname) == key and os.path.exists(fname):
+        return False
+
+    draw(**kwargs).save(fname)
+    if key is not None:
+        manifest[fname] = key
+        with open(MANIFEST, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+    return True
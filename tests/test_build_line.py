@@ -1,5 +1,7 @@
 import io
+import math
 import pytest
+import numpy as np
 from pytest import approx
 
 from build123d import *
@@ -63,3 +65,308 @@ def test_trim():
     nw = trim_wire(w, end=p)
     assert nw.s == Vector(0)
     assert nw.e == Vector(8)
+
+    # the arc is trimmed at the tangent point of a line to (30, 0)
+    for analytic in (False, True):
+        l = build_line(analytic=analytic).append(
+            op_arc(10, 180, center=(0, 0), start_angle=-90), op_trim(by_tangent((30, 0), idx=0), add=True))
+        assert len(l[:]) == 2 and l[1] @ 1 == Vector(30, 0)
+        assert (l[0] @ 1).X == approx(10 / 3) and l[0] @ 1 == l[1] @ 0 and l[0] % 1 == l[1] % 0
+
+
+def test_chains():
+    l = build_line().append(
+        X(10), Y(5),
+        op_line(start=(20, 20), to=(30, 20)), X(5),
+    )
+    assert [len(it) for it in l.chains()] == [2, 2]
+    assert l.last_chain() == l[2:]
+
+    l.append(op_drop(-1), op_move(start=(10, 5)))
+    assert [len(it) for it in l.chains()] == [3]
+
+    l.append(op_line(start=(0, 20), to=(0, 30)), op_line(5, connect=True))
+    assert [len(it) for it in l.chains()] == [6]
+    assert l[3].s == Vector(20, 5) and l[3].e == Vector(0, 20)
+
+    l.append(op_drop(0))
+    assert [len(it) for it in l.chains()] == [5]
+    assert l.s == Vector(10, 0)
+
+
+def test_cached_ends():
+    l = build_line().append(X(10), Y(5))
+    assert (l.s, l.ss, l.ee, l.e) == (Vector(0), Vector(10), Vector(10), Vector(10, 5))
+    assert l.tangent() == Vector(0, 1)
+    assert l.tangent(0, 0) == Vector(1, 0)
+    assert l.normal() == Vector(-1, 0)
+
+    l.move((0, 1))
+    assert l.e == Vector(10, 6)
+
+    l.append(op_move(start=(0, 0)))
+    assert (l.s, l.e) == (Vector(0), Vector(10, 5))
+
+
+def test_analytic_mode():
+    ops = [
+        X(10), op_arc(to=(20, 10)), op_arc(to=XX(30), radius=-7, tangent=False),
+        op_arc(center=(30, 0), radius=5, size=-400, start_angle=30),
+        op_line(angle=-45, until=YY(-10)), op_close(),
+    ]
+    a = build_line(Plane.XZ.offset(3)).append(*ops)
+    b = build_line(Plane.XZ.offset(3), analytic=True).append(*ops)
+    assert all(it._edge is None for it in b._shapes)
+
+    for sa, sb in zip(a.edges(), b.edges()):
+        for p in (0, 0.3, 1):
+            assert (sa @ p - sb @ p).length == approx(0)
+            assert (sa % p - sb % p).length == approx(0)
+    assert b.face().area == approx(a.face().area)
+
+    ops = [X(10), op_arc(to=(20, 10), reverse=True), Y(3), op_extend(start=3, end=2, reverse=True)]
+    a, b = build_line().append(*ops), build_line(analytic=True).append(*ops)
+    assert (a.s, a.e, a.tangent(), a.tangent(0, 0)) == (b.s, b.e, b.tangent(), b.tangent(0, 0))
+    assert a.tangent(-1, 0.3) == b.tangent(-1, 0.3) and len(a.chains()) == len(b.chains())
+
+    l = build_line(analytic=True).append(op_arc(26, -180))
+    assert (l.e - Vector(0, -52)).length == approx(0)
+    assert l.tangent() == Vector(-1, 0)
+
+
+def test_build_batch():
+    from build123d_draft.batch import build_batch
+
+    ops = [X(10), Y(5), XX(0), op_fillet(1), op_close()]
+    rv = build_batch(ops, {(0, 'X'): [10, 20, 30], (3, 'radius'): [1, 2, 0.5]})
+    assert rv.vectorized and rv.vertices.shape == (3, 6, 3)
+    for i, (w, r) in enumerate([(10, 1), (20, 2), (30, 0.5)]):
+        l = build_line().append(X(w), Y(5), XX(0), op_fillet(r), op_close())
+        assert rv.line(i).face().area == approx(l.face().area)
+
+    # paths of the per-variant fallback give the same segments as records
+    params = {(0, 'X'): [10, 20], (3, 'radius'): [1, 2]}
+    a, b = build_batch(ops, params), build_batch(ops, params, vectorize=False)
+    assert not b.vectorized and a.ends.shape == (2, 5, 2, 3)
+    assert np.stack(b.ends) == approx(a.ends) and np.stack(b.vertices) == approx(a.vertices)
+
+    rv = build_batch([X(10), Y(5), op_close()], {(0, 'X'): 10.0})
+    assert rv.size == 1 and rv.vertices.shape == (1, 4, 3)
+
+
+def test_build_many():
+    from build123d_draft.batch import build_many
+
+    recipes = [[X(w), op_arc(2, 90), Y(5), XX(0), op_fillet(1), op_close()] for w in range(5, 25)]
+    rv = build_many(recipes, max_workers=4, analytic=True, cache=True)
+    for ops, it in zip(recipes, rv):
+        assert it.time > 0
+        assert it.line.face().area == approx(build_line(analytic=True).append(*ops).face().area)
+    with trusted_ops():
+        rv = build_many([lambda: op_line(dir=(1, 0))] * 2)
+    assert [it.line.kwargs for it in rv] == [{'dir': (1, 0)}] * 2
+
+
+def test_profile():
+    from build123d_draft.profiling import profile
+
+    with profile() as prof:
+        build_line(analytic=True).append(X(10), Y(5), XX(0), op_fillet(1), op_close())
+        with pytest.raises(Exception):
+            build_line().append(X(1), op_line(to=X(0)))
+    build_line().append(X(1))
+    rv = prof.report()
+    assert [it['op'] for it in rv['ops']][:2] == ['Pos(10.0, 0.0, 0.0)', 'Pos(0.0, 5.0, 0.0)']
+    assert rv['types']['Pos']['count'] == 3 and rv['types']['op_fillet']['shapes'] == 0
+    # only the kernel line stores OCC edges
+    assert [it['shapes'] for it in rv['ops'] if it['type'] == 'Pos'] == [0, 0, 1]
+    assert rv['total']['count'] == 7 and rv['total']['errors'] == 1
+    assert 'op_fillet(1)' in prof.format()
+
+
+def test_op_cache():
+    cache = OpCache(maxsize=8)
+    ops = [X(10), Y(5), op_fillet(1), op_line(to=XX(0), name='top')]
+    a = build_line(cache=cache).append(*ops, op_close())
+    b = build_line(cache=cache).append(*ops, X(-2), op_close())
+    assert cache.hits == 4 and len(cache) == 7
+    assert b.top is a.top
+    assert b.face().area == approx(build_line().append(*ops, X(-2), op_close()).face().area)
+    assert a.face().area == approx(49.785398)
+
+    b.move((0, 1))
+    assert a.s == Vector(0) and b.top.e == Vector(0, 6) and a.top.e == Vector(0, 5)
+    assert build_line(cache=cache).append(X(1)).e == Vector(1)
+    assert len(cache) == 8
+
+    # shapes changed outside of append() aren't keyed, later ops miss the cache
+    l = build_line(cache=cache).append(X(10))
+    l.apply(Y(7))
+    assert [it.e for it in l.append(Y(5))] == [Vector(10), Vector(10, 7), Vector(10, 12)]
+    l = build_line(cache=cache).append(X(10))
+    l.add_shape(Edge.make_line((10, 0), (10, 3)))
+    assert l.append(Y(5)).e == Vector(10, 8)
+
+
+def test_ordered_wire():
+    l = build_line().append(X(10), Y(5), op_fillet(1), XX(0), op_arc(to=(-3, 2)), op_close())
+    w = l.wire()
+    assert w.is_closed and [e @ 0 for e in w.edges()] == [e @ 0 for e in l.edges()]
+    assert l.face().area == approx(Face(l[0] + l[1:]).area)
+
+    l = build_line().append(X(10), op_line(start=(0, 5), length=10))
+    assert len(l.chains()) == 2 and len(l.wire().edges()) == 2
+
+    # edges are rebuilt on shared vertices, reversed edges keep their direction
+    from build123d_draft.build_line import _make_wire
+    arc = Edge.make_three_point_arc((0, 5), (5, 7), (10, 5))
+    w = _make_wire([Edge.make_line((0, 0), (10, 0)), Edge(Edge.make_line((10, 5), (10, 0)).wrapped.Reversed()),
+                    Edge(arc.wrapped.Reversed()), Wire([Edge.make_line((0, 5), (0, 2)), Edge.make_line((0, 2), (0, 0))])])
+    assert w.is_valid() and w.is_closed and len(w.vertices()) == 5
+    assert [e @ 0 for e in w.order_edges()] == [Vector(0, 0), Vector(10, 0), Vector(10, 5), Vector(0, 5), Vector(0, 2)]
+    assert _make_wire([Edge.make_line((0, 0), (1, 0)), Edge.make_line((1.1, 0), (2, 0))]) is None
+
+
+def test_analytic_fillet():
+    ops = [
+        X(10), op_arc(to=(20, 10), radius=8, tangent=False), op_fillet(2),
+        op_arc(to=(0, 10), radius=-15, tangent=False), op_fillet(1.5), op_close(),
+        op_fillet(0.5, count=2, closed=True),
+    ]
+    l = build_line().append(*ops)
+    assert len(l._shapes) == 1 and len(l.wire().edges()) == 8
+    assert l.face().area == approx(153.903539)
+
+    l = build_line().append(X(10), Y(5), XX(0), op_close(), op_chamfer(1, count=4, closed=True))
+    assert l.face().area == approx(48)
+
+    # a fillet after each segment extends the path, inner items are kept as is
+    a = build_line().append(X(10), Y(10), op_fillet(1), X(10), op_fillet(1), Y(-10), op_fillet(1),
+                            X(5), op_fillet(1))
+    b = build_line().append(X(10), Y(10), X(10), Y(-10), X(5), op_fillet(1, count=4))
+    assert len(a._shapes) == 1 and len(a._shapes[0].items) == 9
+    assert [(it.s, it.e) for it in a.edges()] == [(it.s, it.e) for it in b.edges()]
+
+    # corners after a reversed kernel edge, the asymmetric chamfer is fused
+    for op in (op_fillet(2), op_chamfer(2), op_chamfer(2, angle=30)):
+        l = build_line().append(op_line(10, reverse=True), Y(10), op)
+        assert (l.s, l.e, len(l.edges())) == (Vector(10, 0), Vector(0, 10), 3)
+        assert l.wire().length == approx(build_line(analytic=True).append(
+            op_line(10, reverse=True), Y(10), op).wire().length)
+
+
+def test_intersection():
+    w = build_line().append(X(10), Y(10), X(-10), Y(10), X(10)).wire()
+    ax = Axis((5, 0), (0, 1))
+    assert len(intersections(w, ax)) == 3
+    assert intersection(w, ax) == Vector(5, 20)
+    assert intersection(w, ax, near_by=(0, 0)) == Vector(5, 0)
+    assert intersection(w, ax, sort_by=Axis.Y, idx=1) == Vector(5, 10)
+    assert intersection(w, Edge.make_circle(1).moved(Pos(10, 5))) == Vector(10, 6)
+
+    from build123d_draft.tools import _edge_index
+    index = _edge_index(w)
+    assert list(index.candidates(Plane.XZ.offset(-5))) == [1]
+    assert list(index.candidates(Plane.YZ.offset(5))) == [0, 2, 4]
+
+
+def test_wire_params():
+    w = build_line().append(X(10), Y(10), X(-10)).wire()
+    assert param_on_point(w, (10, 5)) == approx(0.5)
+    assert param_on_point(w, (10, 5), normalized=False) == approx(15)
+    t = trim_wire(w, 0.25, 0.75)
+    assert (t @ 0, t @ 1, t.length) == (Vector(7.5, 0), Vector(7.5, 10), approx(15))
+
+
+def test_trusted_ops():
+    with pytest.raises(AssertionError, match='matched_cases=0'):
+        op_line(dir=(1, 0))
+    with pytest.raises(AssertionError, match='matched_cases=0'):
+        op_arc(10, 90, to=(1, 1), center=(0, 0))
+
+    with trusted_ops():
+        op = op_line(dir=(1, 0))
+    assert op.kwargs == {'dir': (1, 0)}
+    with pytest.raises(AssertionError):
+        op_line(dir=(1, 0))
+
+
+def test_point_runs():
+    pl = Plane.XZ.offset(3)
+    l = build_line((1, 2), pl).append(X(10), (12, 5), YY(8), Vector(1, 1, 1), X(2))
+    assert [it.e for it in l] == [
+        Vector(11, -3, 2), Vector(12, -3, 5), Vector(12, -3, 8), Vector(1, 1, 1), Vector(3, 1, 1)]
+
+
+def test_ops_ir():
+    from build123d_draft import ir
+
+    ops = [
+        X(10), op_arc(5, 90), YY(3), (1, 2),
+        op_line(dir=(0, 1), until=Axis.X.offset(Y=30), name='a', reverse=True),
+        op_close(Axis.Y), op_fillet(1, count=2, closed=True),
+    ]
+    s = ir.dumps(ops)
+    restored = ir.loads(s)
+    assert ir.dumps(restored) == s and ir.ops_hash(restored) == ir.ops_hash(ops)
+    assert restored[2].default_zdir == (0, 1, 0) and restored[3] == (1, 2)
+
+    a = build_line(analytic=True).append(*ops)
+    b = build_line(analytic=True).append(*restored)
+    assert b.face().area == approx(a.face().area) and b.a.e == a.a.e
+
+    with pytest.raises(TypeError):
+        ir.dumps([Edge.make_line((0, 0), (1, 0))])
+
+
+def test_disk_cache(tmp_path):
+    from build123d_draft.brep_cache import DiskCache
+
+    cache = DiskCache(tmp_path)
+    ops = [X(10), Y(5), op_fillet(1), XX(0), op_close()]
+    a = build_line(disk_cache=cache).append(*ops)
+    assert a.face().area == approx(49.785398) and (cache.hits, cache.misses) == (0, 2)
+
+    b = build_line(disk_cache=cache).append(*ops[:2]).append(*ops[2:])
+    f = b.face()
+    assert isinstance(f, Sketch) and f.area == approx(49.785398)
+    assert b.wire().length == approx(29.570796) and cache.hits == 2
+    assert cache.size == sum(it[1] for it in cache.entries())
+
+    other = DiskCache(tmp_path, salt='other')
+    build_line(disk_cache=other).append(*ops).face()
+    assert (other.hits, other.misses) == (0, 2)
+
+    assert build_line(disk_cache=cache).append(X(10), Y(5), XX(0), op_close()).face().area == approx(50)
+    c = build_line(disk_cache=cache).append(X(10), Y(5))
+    c.add_shape(Edge.make_line((10, 5), (10, 10)))
+    assert c.append(XX(0), op_close()).face().area == approx(100)
+
+    # the running size follows stores and only an overflow rescans the dir
+    small = DiskCache(tmp_path, max_size=cache.size)
+    build_line(disk_cache=small).append(X(3), Y(3), XX(0), op_close()).face()
+    assert small.size == sum(it[1] for it in small.entries()) <= small.max_size
+
+    from build123d_draft import brep_cache
+    assert f'src={brep_cache.source_hash()}' in cache.salt
+
+    DiskCache(tmp_path, max_size=0).evict()
+    assert not list(tmp_path.iterdir())
+
+
+def test_pickle():
+    import pickle
+    from build123d_draft.tools import Cylinder
+
+    for analytic in (False, True):
+        a = build_line((1, 2), Plane.XZ, analytic=analytic, cache=True)
+        a.append(X(10), op_line(to=YY(5), name='side'), op_fillet(1), XX(0), op_close())
+        b = pickle.loads(pickle.dumps(a))
+        assert b.face().area == approx(a.face().area) and b.cache is a.cache
+        assert b.side.length == approx(3)
+        assert b.append(Y(3)).e == Vector(1, 0, 5)
+
+    c = Cylinder(1, 2)
+    c.label = 'cyl'
+    c = pickle.loads(pickle.dumps(c))
+    assert c.label == 'cyl' and c.new(d=4).volume == approx(8 * math.pi)
@@ -0,0 +1,249 @@
+import pytest
+import numpy as np
+
+from build123d_draft import render
+
+
+class FakeContext:
+    def __init__(self, size, bg=None):
+        self.size = size
+        self.bg = bg
+        self.leases = 0
+        self.released = False
+        self.view, self.ctx = 'view', 'ctx'
+
+    def set_background(self, bg):
+        self.bg = bg
+
+    def release(self):
+        self.released = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(render, 'RenderContext', FakeContext)
+    return render.RenderPool(maxsize=2)
+
+
+def test_render_pool(pool):
+    a = pool.get((10, 10), (1, 1, 1))
+    assert pool.get((10, 10), (1, 1, 1)) is a and a.leases == 2
+    b = pool.get((10, 10), (0, 0, 0))
+    # full, a and b are leased: neither is evicted or re-keyed
+    c = pool.get((10, 10), (1, 0, 1))
+    assert len({id(a), id(b), id(c)}) == 3 and len(pool) == 3
+    assert a.bg == (1, 1, 1) and not a.released
+
+    pool.put(a)
+    pool.put(a)
+    assert a.released and len(pool) == 2
+
+    # an unleased context of the same size is reused with a new background
+    pool.put(b)
+    d = pool.get((10, 10), (0, 1, 0))
+    assert d is b and b.bg == (0, 1, 0) and not b.released
+    e = pool.get((10, 10), (0, 0, 0))
+    assert e is not b and len(pool) == 3
+
+    pool.release()
+    assert not c.released and len(pool) == 3
+    pool.put(c)
+    pool.release((10, 10), (1, 0, 1))
+    assert c.released and len(pool) == 2
+
+
+def test_render_context(pool, monkeypatch):
+    monkeypatch.setattr(render, 'render_pool', pool)
+    assert render.render_context((10, 10), None) == ('view', 'ctx')
+    # the lease of the old API is never returned, the context stays alive
+    render.render_context((10, 10), None)
+    pool.release()
+    assert len(pool) == 1 and next(iter(pool._data.values())).leases == 2
+
+
+def test_tessellation_cache():
+    from build123d import Box, Pos
+    from OCP.Prs3d import Prs3d_Drawer
+
+    drawer = Prs3d_Drawer()
+    cache = render.TessellationCache()
+    a = Box(10, 10, 10)
+    m = cache.get(a.wrapped, drawer)
+    # relative deflection of the first shape doesn't leak into the shared drawer
+    assert not drawer.HasOwnMaximalChordialDeviation()
+    assert cache.misses == 1 and cache.size == render.mesh_size(m) > 0
+
+    assert cache.get(a.wrapped, drawer).IsEqual(m)
+    moved = Pos(5, 0) * Box(10, 10, 10)
+    rv = cache.get(moved.wrapped, drawer)
+    assert rv.IsPartner(m) and rv.Location().IsEqual(moved.wrapped.Location())
+    assert (cache.hits, cache.misses, len(cache._data)) == (2, 1, 1)
+
+    # a smaller box has a finer absolute deflection, then the oldest entry is evicted
+    cache.max_bytes = cache.size
+    cache.get(Box(1, 1, 1).wrapped, drawer)
+    assert len(cache._data) == 1 and cache.misses == 2
+    assert cache.size == sum(it[1] for it in cache._data.values())
+    assert all(v in cache._data for v in cache._identity.values())
+
+
+def test_render_manifest(tmp_path, monkeypatch):
+    from PIL import Image
+    from build123d import Box, Plane
+    from tests import conftest
+
+    monkeypatch.setattr(conftest, 'MANIFEST', str(tmp_path / 'manifest.json'))
+    calls = []
+
+    def draw(**kwargs):
+        calls.append(kwargs)
+        return Image.new('RGBA', (2, 1))
+
+    fname = str(tmp_path / 'box.png')
+    box = Box(1, 2, 3)
+    views = [conftest.view(), conftest.view(30, clip=Plane.XZ)]
+    render = lambda **kw: conftest.render_cached(fname, box, views, (2, 1), draw, **kw)
+    assert render() and not render() and len(calls) == 1
+
+    box.color = (1, 0, 0)
+    assert render() and not render()
+    assert render(alpha=0.5) and calls[-1] == {'alpha': 0.5}
+    assert not conftest.render_cached(fname, Box(1, 2, 3), views, (2, 1), draw, alpha=0.5, color=(1, 0, 0))
+
+    views[1].hscale = 0.1
+    assert render(alpha=0.5)
+    (tmp_path / 'box.png').unlink()
+    assert render(alpha=0.5) and len(calls) == 5
+
+
+def test_bmp_array():
+    import io
+    import OCP
+    from OCP.Quantity import Quantity_ColorRGBA
+
+    for fmt, channels in ((OCP.Image.Image_Format_RGBA, 4), (OCP.Image.Image_Format_RGB, 3)):
+        image = OCP.Image.Image_AlienPixMap()
+        image.InitZero(fmt, 5, 3, 0, 0)
+        image.SetPixelColor(0, 0, Quantity_ColorRGBA(1, 0, 0, 1))
+        image.SetPixelColor(4, 2, Quantity_ColorRGBA(0, 0, 1, 1))
+        buf = io.BytesIO()
+        image.Save(buf, OCP.TCollection.TCollection_AsciiString('.bmp'))
+        # rows of 5 RGB pixels are padded to 16 bytes
+        d = render.bmp_array(buf.getbuffer())
+        assert d.shape == (3, 5, channels)
+        assert list(d[0, 0, :3]) == [0, 0, 255] and list(d[2, 4, :3]) == [255, 0, 0]
+        assert not d[1].any()
+
+
+def test_downsample():
+    d = np.zeros((4, 6, 4), np.uint8)
+    d[:2, :2] = [200, 100, 50, 255]
+    d[0, 0] = 0
+    d[2:, 4:] = [10, 20, 30, 255]
+    rv = render.downsample(d, (3, 2))
+    # keyed out pixels don't darken colors, only lower alpha
+    assert rv.dtype == np.uint8 and rv.shape == (2, 3, 4)
+    assert list(rv[0, 0]) == [200, 100, 50, 191] and list(rv[1, 2]) == [10, 20, 30, 255]
+    assert not rv[0, 1:].any() and not rv[1, :2].any()
+    # non-integer factors fall back to PIL
+    assert render.downsample(d, (4, 3)).shape == (3, 4, 4)
+
+
+class FakeScene:
+    def __init__(self):
+        self.shown = []
+        self.planes = []
+        self.log = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.log.append((name, args))
+
+    def Display(self, prs, *args):
+        self.shown.append(prs)
+
+    def Erase(self, prs, *args):
+        self.shown.remove(prs)
+
+    def AddClipPlane(self, plane):
+        self.planes.append(plane)
+
+    def RemoveClipPlane(self, plane):
+        self.planes.remove(plane)
+
+
+def test_render_views():
+    from PIL import Image
+    from build123d import Plane
+
+    class Exporter(render.ImageExporter):
+        def __init__(self):
+            self.ctx = self.view = self.prs = FakeScene()
+            self.made = []
+            self.frames = 0
+
+        def presentation(self, shape, **kwargs):
+            self.made.append(('shape', kwargs))
+            return self.prs
+
+        def clip_outline(self, shape, clip):
+            self.made.append(('outline', clip.origin.Y))
+            return [f'outline {clip.origin.Y}']
+
+        def clip_plane(self, clip, hatch=True, hscale=0.05, color=None):
+            self.made.append(('plane', clip.origin.Y, hscale))
+            return f'plane {clip.origin.Y} {hscale}'
+
+        def setup_view(self, **kwargs):
+            self.camera = kwargs
+
+        def export(self):
+            # a frame records what was on the scene
+            self.frames += 1
+            img = Image.new('RGBA', (2 + len(self.ctx.shown), 3), (self.frames, 0, 0, 255))
+            img.info['scene'] = list(self.ctx.shown[1:]), list(self.prs.planes), self.camera
+            return img
+
+    ie = Exporter()
+    clip = Plane.XZ.offset(-1)
+    views = [{'rotz': 30}, {'clip': clip, 'roty': 10}, {'clip': clip, 'hscale': 0.1, 'zoom': 2},
+             {'clip': Plane.XZ.offset(-2), 'proj': 'Z'}, {}]
+    images = ie.render_views('shape', views, alpha=0.5)
+    assert [it.info['scene'] for it in images] == [
+        ([], [], {'rotz': 30}),
+        (['outline 1.0'], ['plane 1.0 0.05'], {'roty': 10}),
+        (['outline 1.0'], ['plane 1.0 0.1'], {'zoom': 2}),
+        (['outline 2.0'], ['plane 2.0 0.05'], {'proj': 'Z'}),
+        ([], [], {}),
+    ]
+    # the shape is displayed once, outlines and planes once per distinct clip
+    assert ie.made == [('shape', {'alpha': 0.5}), ('outline', 1.0), ('plane', 1.0, 0.05),
+                       ('plane', 1.0, 0.1), ('outline', 2.0), ('plane', 2.0, 0.05)]
+
+    out = Exporter().render_views('shape', views, tile=True)
+    assert out.size == (sum(it.size[0] for it in images), 3)
+    assert [out.getpixel((x, 2))[0] for x in range(out.size[0])] == [
+        i for i, it in enumerate(images, 1) for _ in range(it.size[0])]
+
+
+def test_section(monkeypatch):
+    import collections
+    from build123d import Box, Cylinder, Compound, Plane
+
+    monkeypatch.setattr(render, '_sections', collections.OrderedDict())
+    part = Box(10, 10, 10) - Cylinder(2, 10)
+    a = render.section(part.wrapped, Plane.XZ)
+    assert len(Compound(a).edges()) == 8
+    assert render.section(part.wrapped, Plane.XZ) is a
+    assert render.section(Box(10, 10, 10).wrapped, Plane.XZ) is not a
+
+    # least recently used sections are dropped first
+    render._sections.clear()
+    a = render.section(part.wrapped, Plane.XZ, maxsize=2)
+    b = render.section(part.wrapped, Plane.YZ, maxsize=2)
+    assert render.section(part.wrapped, Plane.XZ, maxsize=2) is a
+    render.section(part.wrapped, Plane.XZ.offset(1), maxsize=2)
+    assert len(render._sections) == 2 and render.section(part.wrapped, Plane.XZ) is a
+    assert render.section(part.wrapped, Plane.YZ) is not b
+
+    assert render.hatch_texture(0.05) is render.hatch_texture(0.05)
+    assert render.hatch_texture(0.1) is not render.hatch_texture(0.05)